@@ -0,0 +1,121 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from streamlit_in_steps.ingest import build_foods_dict
+
+# Benchmark - Compare the column based build_foods_dict in ingest.py
+# against the original row by row (df.iterrows) implementation from
+# streamlit_step_5.py
+#
+# Run with:
+# poetry run python benchmarks/bench_build_foods_dict.py
+# poetry run python benchmarks/bench_build_foods_dict.py --rows 1000 100000
+
+ratings = ["love", "like", "indifferent", "dislike", "review"]
+
+
+# The original implementation, kept here as the reference for both
+# timing and correctness
+def build_foods_dict_iterrows(df):
+    foods_dict = {
+        "fruit": {},
+        "vegetable": {},
+        "meat": {},
+    }
+
+    if "fruit_rating" not in df.columns:
+        df["fruit_rating"] = "review"
+    if "vegetable_rating" not in df.columns:
+        df["vegetable_rating"] = "review"
+    if "meat_rating" not in df.columns:
+        df["meat_rating"] = "review"
+
+    for index, row in df.iterrows():
+        fruit = row.get("fruit")
+        vegetable = row.get("vegetable")
+        meat = row.get("meat")
+
+        fruit_rating = row.get("fruit_rating")
+        vegetable_rating = row.get("vegetable_rating")
+        meat_rating = row.get("meat_rating")
+
+        if pd.notna(fruit) and pd.isna(fruit_rating):
+            fruit_rating = "Review"
+        if pd.notna(vegetable) and pd.isna(vegetable_rating):
+            vegetable_rating = "Review"
+        if pd.notna(meat) and pd.isna(meat_rating):
+            meat_rating = "Review"
+
+        if pd.notna(fruit):
+            foods_dict["fruit"][fruit] = fruit_rating
+        if pd.notna(vegetable):
+            foods_dict["vegetable"][vegetable] = vegetable_rating
+        if pd.notna(meat):
+            foods_dict["meat"][meat] = meat_rating
+
+    return foods_dict
+
+
+# Generate a wide format DataFrame with the given number of rows.
+# Categories have unequal lengths and some ratings are missing so that
+# the padding and missing rating paths are exercised
+def make_wide_df(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    data = {}
+    for position, food_type in enumerate(["fruit", "vegetable", "meat"]):
+        length = rows - position * (rows // 10)
+        foods = [f"{food_type}_{i}" for i in range(length)]
+        food_ratings = rng.choice(ratings + [None], size=length).tolist()
+        pad = [None] * (rows - length)
+        data[food_type] = foods + pad
+        data[f"{food_type}_rating"] = food_ratings + pad
+    return pd.DataFrame(data)
+
+
+def time_call(func, df):
+    start = time.perf_counter()
+    result = func(df)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+",
+                        default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--skip-iterrows", action="store_true",
+                        help="Only time the column based implementation")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'iterrows (s)':>14} {'columns (s)':>12} "
+          f"{'speedup':>8}")
+
+    for rows in args.rows:
+        df = make_wide_df(rows)
+
+        columns_time, result = time_call(build_foods_dict, df)
+
+        if args.skip_iterrows:
+            print(f"{rows:>10} {'-':>14} {columns_time:>12.4f} {'-':>8}")
+            continue
+
+        iterrows_time, expected = time_call(build_foods_dict_iterrows,
+                                            df.copy())
+
+        # The original gave missing ratings "Review", build_foods_dict
+        # validates them to the allowed "review"
+        expected = {food_type: {food: "review" if rating == "Review"
+                                else rating
+                                for food, rating in food_ratings.items()}
+                    for food_type, food_ratings in expected.items()}
+        if result != expected:
+            raise AssertionError(f"Results differ for {rows} rows")
+
+        print(f"{rows:>10} {iterrows_time:>14.4f} {columns_time:>12.4f} "
+              f"{iterrows_time / columns_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from streamlit_in_steps.columnar import load_file, read_table, write_binary
+from streamlit_in_steps.export import write_csv
+from streamlit_in_steps.store import RatingStore
+
+from bench_format_data import make_foods, ratings
+
+# Benchmark - Compare saving and loading the ratings as CSV (write_csv and
+# read_csv/load_foods) against Parquet and Feather (write_binary and
+# memory mapped loads), reporting time and file size for both layouts
+#
+# read is the time to read the file into a DataFrame, load includes
+# building the foods dictionary as the app does
+#
+# Run with:
+# poetry run python benchmarks/bench_file_formats.py
+# poetry run python benchmarks/bench_file_formats.py --foods 1000 100000
+
+
+def save(file_prefix, file_type, layout, store):
+    if file_type == "csv":
+        return write_csv(file_prefix, layout, store)
+    return write_binary(file_prefix, layout, store, file_type)
+
+
+def read(file_path, file_type):
+    if file_type == "csv":
+        return pd.read_csv(file_path, low_memory=False)
+    return read_table(file_path, file_type).to_pandas()
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--foods", type=int, nargs="+",
+                        default=[1_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'foods':>10} {'layout':>6} {'format':>8} {'save (s)':>9} "
+          f"{'read (s)':>9} {'load (s)':>9} {'size (MB)':>10}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for total in args.foods:
+            foods = make_foods(total)
+            store = RatingStore.from_dict(foods, ratings)
+
+            for layout in ["long", "wide"]:
+                for file_type in ["csv", "parquet", "feather"]:
+                    file_prefix = os.path.join(directory,
+                                               f"{layout}_{file_type}")
+                    (success, error, file_path), save_time = timed(
+                        save, file_prefix, file_type, layout, store)
+                    if not success:
+                        raise RuntimeError(error)
+
+                    df, read_time = timed(read, file_path, file_type)
+                    (_, loaded, _), load_time = timed(load_file, file_path,
+                                                      file_path)
+                    if loaded != foods:
+                        raise AssertionError(
+                            f"{file_type} {layout} did not load the saved "
+                            f"foods for {total} foods")
+
+                    print(f"{total:>10} {layout:>6} {file_type:>8} "
+                          f"{save_time:>9.4f} {read_time:>9.4f} "
+                          f"{load_time:>9.4f} "
+                          f"{os.path.getsize(file_path) / 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
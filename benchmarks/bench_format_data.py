@@ -0,0 +1,104 @@
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from streamlit_in_steps.export import format_data
+from streamlit_in_steps.store import RatingStore
+
+# Benchmark - Compare the wide format writer in export.py against the
+# original list padding implementation of format_data(type="wide") from
+# streamlit_step_5.py, reporting time and peak memory
+#
+# Run with:
+# poetry run python benchmarks/bench_format_data.py
+# poetry run python benchmarks/bench_format_data.py --foods 1000 100000
+
+ratings = ["love", "like", "indifferent", "dislike", "review"]
+
+
+# The original implementation, kept here as the reference for both
+# timing and correctness
+def format_data_wide_lists(data):
+    max_length = max(
+        len(data["fruit"]),
+        len(data["vegetable"]),
+        len(data["meat"])
+    )
+
+    return pd.DataFrame(
+        {
+            "fruit": list(data["fruit"].keys()) +
+            [""] * (max_length - len(data["fruit"])),
+            "fruit_rating": list(data["fruit"].values()) +
+            [""] * (max_length - len(data["fruit"])),
+            "vegetable": list(data["vegetable"].keys()) +
+            [""] * (max_length - len(data["vegetable"])),
+            "vegetable_rating": list(data["vegetable"].values()) +
+            [""] * (max_length - len(data["vegetable"])),
+            "meat": list(data["meat"].keys()) +
+            [""] * (max_length - len(data["meat"])),
+            "meat_rating": list(data["meat"].values()) +
+            [""] * (max_length - len(data["meat"])),
+        }
+    )
+
+
+# Generate a foods dictionary with the given total number of foods split
+# unevenly across the three food types
+def make_foods(total, seed=0):
+    rng = np.random.default_rng(seed)
+    shares = {"fruit": 0.5, "vegetable": 0.3, "meat": 0.2}
+    foods = {}
+    for food_type, share in shares.items():
+        count = int(total * share)
+        food_ratings = rng.choice(ratings, size=count).tolist()
+        foods[food_type] = {f"{food_type}_{i}": rating
+                            for i, rating in enumerate(food_ratings)}
+    return foods
+
+
+# Return the result, wall time in seconds and peak traced memory in bytes
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--foods", type=int, nargs="+",
+                        default=[1_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'foods':>10} {'writer':>14} {'time (s)':>10} {'peak (MB)':>10}")
+
+    for total in args.foods:
+        foods = make_foods(total)
+        store = RatingStore.from_dict(foods, ratings)
+
+        expected, lists_time, lists_peak = measure(format_data_wide_lists,
+                                                   foods)
+        result, arrays_time, arrays_peak = measure(format_data, "wide",
+                                                   foods)
+        store_result, store_time, store_peak = measure(format_data, "wide",
+                                                       store)
+
+        if not result.equals(expected):
+            raise AssertionError(f"Results differ for {total} foods")
+
+        for name, elapsed, peak in [("lists", lists_time, lists_peak),
+                                    ("arrays", arrays_time, arrays_peak),
+                                    ("store", store_time, store_peak)]:
+            print(f"{total:>10} {name:>14} {elapsed:>10.4f} "
+                  f"{peak / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
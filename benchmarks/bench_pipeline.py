@@ -0,0 +1,254 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from streamlit_in_steps.export import format_data, write_csv
+from streamlit_in_steps.ingest import (build_foods_dict,
+                                       build_foods_dict_long, load_foods)
+from streamlit_in_steps.store import RatingStore
+from streamlit_in_steps.widget_keys import widget_key_prefix
+
+# Benchmark - Time each phase of the step 5 load -> edit -> save pipeline
+# on synthetic wide and long format CSV files and report the wall time and
+# peak traced memory of every phase as JSON
+#
+# Phases:
+# - read_csv      pd.read_csv of the whole file
+# - build         build_foods_dict (wide) or build_foods_dict_long (long)
+# - store         RatingStore.from_dict
+# - app_load      first headless run of step 5 with the file uploaded
+# - app_rerun     rerun of step 5 after changing one rating
+# - format_data   format_data in the same format as the file
+# - write_csv     write_csv in the same format as the file
+#
+# Run with:
+# poetry run python benchmarks/bench_pipeline.py
+# poetry run python benchmarks/bench_pipeline.py --rows 1000 --categories 3 \
+#     --formats wide --output bench.json
+
+ratings = ["love", "like", "indifferent", "dislike", "review"]
+
+app_path = os.path.join(os.path.dirname(__file__), os.pardir, "src",
+                        "streamlit_in_steps", "streamlit_step_5.py")
+
+# Runs step 5 with the file uploader replaced by one that always returns
+# the benchmark CSV file (as a list when multiple files are accepted)
+app_script = """
+import io
+import runpy
+
+from streamlit.delta_generator import DeltaGenerator
+
+
+class UploadedCSV(io.BytesIO):
+    name = {name!r}
+    file_id = {path!r}
+
+
+def file_uploader(self, *args, **kwargs):
+    with open({path!r}, "rb") as csv_file:
+        uploaded_file = UploadedCSV(csv_file.read())
+    if kwargs.get("accept_multiple_files"):
+        return [uploaded_file]
+    return uploaded_file
+
+
+DeltaGenerator.file_uploader = file_uploader
+runpy.run_path({app!r}, run_name="__main__")
+"""
+
+default_cases = [
+    (1_000, 3), (100_000, 3), (1_000_000, 3), (1_000, 500), (10_000, 500),
+]
+
+
+# Write a wide format CSV, each food type has rows foods except every
+# other food type which is 10% shorter and padded with empty cells
+def make_wide_csv(path, rows, categories, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for category in range(categories):
+        food_type = f"type_{category}"
+        length = rows - (category % 2) * (rows // 10)
+        foods = np.full(rows, None, dtype=object)
+        foods[:length] = [f"{food_type}_food_{i}" for i in range(length)]
+        food_ratings = np.full(rows, None, dtype=object)
+        food_ratings[:length] = rng.choice(ratings, size=length)
+        columns[food_type] = foods
+        columns[f"{food_type}_rating"] = food_ratings
+    pd.DataFrame(columns).to_csv(path, index=False)
+
+
+# Write a long format CSV with rows foods spread over the food types
+def make_long_csv(path, rows, categories, seed=0):
+    rng = np.random.default_rng(seed)
+    food_types = np.arange(rows) % categories
+    pd.DataFrame({
+        "food_type": [f"type_{food_type}" for food_type in food_types],
+        "food": [f"food_{i}" for i in range(rows)],
+        "rating": rng.choice(ratings, size=rows),
+    }).to_csv(path, index=False)
+
+
+# Run func twice, once for wall time and once with tracemalloc for peak
+# memory, and return the result of the timed run
+def measure(results, phase, func, trace_memory):
+    gc.collect()
+    start = time.perf_counter()
+    result = func()
+    results[phase] = {"seconds": round(time.perf_counter() - start, 6)}
+
+    if trace_memory:
+        del result
+        gc.collect()
+        tracemalloc.start()
+        result = func()
+        results[phase]["peak_mb"] = round(
+            tracemalloc.get_traced_memory()[1] / 1e6, 3)
+        tracemalloc.stop()
+
+    return result
+
+
+# Run step 5 headless with the CSV file uploaded, starting from an empty
+# parse cache
+def run_app(csv_path):
+    st.cache_resource.clear()
+    at = AppTest.from_string(
+        app_script.format(name=os.path.basename(csv_path), path=csv_path,
+                          app=os.path.abspath(app_path)),
+        default_timeout=600)
+    return check_app(at.run())
+
+
+def check_app(at):
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return at
+
+
+# Change the rating of the first food shown and rerun the app, the food
+# radios are told apart from the other radios by their keys
+def change_rating(at):
+    radio = next(radio for radio in at.radio
+                 if (radio.key or "").startswith(widget_key_prefix))
+    radio.set_value(ratings[(ratings.index(radio.value) + 1) % len(ratings)])
+    return check_app(at.run())
+
+
+# Read the whole CSV file and build the foods dictionary from it, the
+# DataFrame is freed once the dictionary is built
+def read_and_build(phases, csv_path, csv_format, trace_memory):
+    df = measure(phases, "read_csv", lambda: pd.read_csv(csv_path),
+                 trace_memory)
+
+    if csv_format == "wide":
+        return measure(phases, "build", lambda: build_foods_dict(df),
+                       trace_memory)
+    return measure(phases, "build", lambda: build_foods_dict_long([df]),
+                   trace_memory)
+
+
+def run_case(directory, csv_format, rows, categories, trace_memory):
+    csv_path = os.path.join(directory, f"{csv_format}_{rows}_{categories}.csv")
+    if csv_format == "wide":
+        make_wide_csv(csv_path, rows, categories)
+    else:
+        make_long_csv(csv_path, rows, categories)
+
+    phases = {}
+
+    foods = read_and_build(phases, csv_path, csv_format, trace_memory)
+    if csv_format == "long":
+        measure(phases, "build_chunked", lambda: load_foods(csv_path)[1],
+                trace_memory)
+
+    store = measure(phases, "store",
+                    lambda: RatingStore.from_dict(foods, ratings),
+                    trace_memory)
+
+    at = measure(phases, "app_load", lambda: run_app(csv_path),
+                 trace_memory)
+    measure(phases, "app_rerun", lambda: change_rating(at), trace_memory)
+
+    measure(phases, "format_data", lambda: format_data(csv_format, store),
+            trace_memory)
+
+    output_prefix = os.path.join(directory, "output", "food_ratings")
+    measure(phases, "write_csv",
+            lambda: write_csv(output_prefix, csv_format, store),
+            trace_memory)
+
+    return {
+        "format": csv_format,
+        "rows": rows,
+        "categories": categories,
+        "file_mb": round(os.path.getsize(csv_path) / 1e6, 3),
+        "phases": phases,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+",
+                        help="Row counts, combined with --categories")
+    parser.add_argument("--categories", type=int, nargs="+",
+                        help="Food type counts, combined with --rows")
+    parser.add_argument("--formats", nargs="+", default=["wide", "long"],
+                        choices=["wide", "long"])
+    parser.add_argument("--skip-memory", action="store_true",
+                        help="Only report wall time")
+    parser.add_argument("--output", help="Write the JSON report to a file")
+    args = parser.parse_args()
+
+    if args.rows or args.categories:
+        cases = [(rows, categories)
+                 for rows in args.rows or [1_000]
+                 for categories in args.categories or [3]]
+    else:
+        cases = default_cases
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, "output"))
+
+        # Step 5 writes its journals relative to the working directory
+        working_directory = os.getcwd()
+        os.chdir(directory)
+        try:
+            for csv_format in args.formats:
+                for rows, categories in cases:
+                    print(f"{csv_format} {rows} rows {categories} categories",
+                          file=sys.stderr)
+                    results.append(run_case(directory, csv_format, rows,
+                                            categories,
+                                            not args.skip_memory))
+        finally:
+            os.chdir(working_directory)
+
+    report = json.dumps({
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+        "streamlit": st.__version__,
+        "results": results,
+    }, indent=2)
+
+    if args.output:
+        with open(args.output, "w") as report_file:
+            report_file.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import gc
+import random
+import tracemalloc
+
+from streamlit_in_steps.store import RatingStore
+
+from bench_format_data import make_foods, ratings
+
+# Benchmark - Memory held by each additional session that loads the same
+# file, comparing a per session copy of the foods dictionary (as
+# build_foods_dict gave every session) with a copy on write copy of the
+# shared ratings store after a number of rating changes
+#
+# Run with:
+# poetry run python benchmarks/bench_session_memory.py
+# poetry run python benchmarks/bench_session_memory.py --foods 100000 \
+#     --sessions 20
+
+
+# Change the rating of changes random foods in a session
+def change_ratings(session, foods, changes, seed):
+    rng = random.Random(seed)
+    food_types = list(foods)
+    for _ in range(changes):
+        food_type = rng.choice(food_types)
+        food = f"{food_type}_{rng.randrange(len(foods[food_type]))}"
+        session[food_type][food] = rng.choice(ratings)
+
+
+# Return the memory retained per session in bytes when sessions copies are
+# made with new_session
+def memory_per_session(new_session, sessions):
+    gc.collect()
+    tracemalloc.start()
+    kept = [new_session(seed) for seed in range(sessions)]
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return retained / sessions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--foods", type=int, nargs="+",
+                        default=[100_000, 1_000_000])
+    parser.add_argument("--sessions", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'foods':>10} {'session':>16} {'changes':>8} "
+          f"{'per session (MB)':>17}")
+
+    for total in args.foods:
+        foods = make_foods(total)
+        base = RatingStore.from_dict(foods, ratings)
+
+        def dict_session(seed):
+            return {food_type: dict(food_ratings)
+                    for food_type, food_ratings in foods.items()}
+
+        rows = [("dict copy", 0,
+                 memory_per_session(dict_session, args.sessions))]
+
+        for changes in [0, 100, total // 100, total // 10]:
+            def store_session(seed):
+                session = base.copy()
+                change_ratings(session, foods, changes, seed)
+                return session
+
+            rows.append(("store copy", changes,
+                         memory_per_session(store_session, args.sessions)))
+
+        for name, changes, per_session in rows:
+            print(f"{total:>10} {name:>16} {changes:>8} "
+                  f"{per_session / 1e6:>17.3f}")
+
+
+if __name__ == "__main__":
+    main()
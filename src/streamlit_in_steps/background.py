@@ -0,0 +1,63 @@
+import threading
+from concurrent import futures
+
+# Background - Parse uploaded CSV files on a worker thread so the script
+# can keep the page up to date while large files load
+#
+# A ParseJob runs parse(files, progress) on an executor (a
+# concurrent.futures ThreadPoolExecutor shared by every session), files is
+# a list of (name, source) and size is their total size in bytes. The
+# parse function reports its progress through progress(rows, food types,
+# bytes parsed), which records the progress and stops the parse with
+# ParseCancelled once the job has been cancelled, e.g. because a different
+# file has been uploaded.
+#
+# Threads are used rather than processes so the parsed DataFrame and
+# ratings store are shared with the session without being copied, pandas
+# releases the GIL while it tokenises each chunk.
+
+
+class ParseCancelled(Exception):
+    pass
+
+
+class ParseJob:
+    def __init__(self, executor, parse, files, file_hash, size):
+        self.file_hash = file_hash
+        self.size = size
+        self.rows = 0
+        self.food_types = 0
+        self.fraction = 0.0
+        self._cancel = threading.Event()
+        self._future = executor.submit(parse, files, self._progress)
+
+    # Called by the parse function as it reads the files
+    def _progress(self, rows, food_types, bytes_parsed):
+        if self._cancel.is_set():
+            raise ParseCancelled()
+        self.rows = rows
+        self.food_types = food_types
+        if self.size:
+            self.fraction = min(bytes_parsed / self.size, 1.0)
+
+    # Stop the parse at its next chunk, the result is discarded
+    def cancel(self):
+        self._cancel.set()
+        self._future.cancel()
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    # Wait up to timeout seconds for the parse, True once it has finished
+    def wait(self, timeout):
+        try:
+            self._future.exception(timeout=timeout)
+        except futures.TimeoutError:
+            return False
+        except futures.CancelledError:
+            pass
+        return True
+
+    # Return the result of the parse, raising any error from the parse
+    def result(self):
+        return self._future.result()
@@ -0,0 +1,73 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Cache - A bounded least recently used (LRU) cache keyed by a hash of
+# file content, used to avoid parsing the same CSV file on every rerun
+#
+# Streamlit reruns the whole script on each widget change and serves every
+# browser session from its own thread, so the cache is shared across
+# sessions (st.cache_resource) and guarded with a lock.
+#
+# Entries are evicted, least recently used first, when either the number
+# of entries or the total size of the entries exceeds its limit.
+
+
+# Return a hash of the file content that is used as the cache key,
+# identical uploads produce the same key regardless of the file name
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class LRUCache:
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    # Return the cached value for key, or None if it is not cached.
+    # A hit marks the entry as the most recently used
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            value, size = self._entries[key]
+            return value
+
+    # Add a value of the given size in bytes to the cache, evicting the
+    # least recently used entries until both limits are met.
+    # Values larger than max_bytes are not cached
+    def put(self, key, value, size):
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+
+            if size > self.max_bytes:
+                return
+
+            self._entries[key] = (value, size)
+            self.total_bytes += size
+
+            while (len(self._entries) > self.max_entries
+                   or self.total_bytes > self.max_bytes):
+                evicted_key, (evicted_value, evicted_size) = \
+                    self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
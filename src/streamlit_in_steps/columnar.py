@@ -0,0 +1,144 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from streamlit_in_steps.export import (apply_retention, format_data,
+                                       output_retention, versioned_file_path,
+                                       write_atomic)
+from streamlit_in_steps.ingest import (add_long_format_chunk,
+                                       build_foods_dict, detect_format,
+                                       load_foods)
+
+# Columnar - Load and save the ratings as Parquet or Arrow (Feather) files
+# as well as CSV
+#
+# Both layouts are supported, the columns are the same as the long and wide
+# CSV formats. Rating (and long format food type) columns are written as
+# dictionary encoded columns, each distinct rating is stored once and every
+# row holds a small integer code. Missing foods and ratings in the wide
+# layout are written as nulls rather than empty strings.
+#
+# Files read from a path are memory mapped, uploaded files are read
+# straight from their bytes without a copy. pyarrow is installed with
+# Streamlit.
+
+# File extension of each binary format
+binary_formats = {
+    "parquet": ".parquet",
+    "feather": ".feather",
+}
+
+# Extensions accepted for each binary format when loading
+binary_extensions = {
+    ".parquet": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+}
+
+
+# Return the binary format of a file from its name, or None for CSV
+def binary_file_format(name):
+    return binary_extensions.get(os.path.splitext(name)[1].lower())
+
+
+# Build an Arrow table from the foods dictionary (or ratings store) in the
+# long or wide layout
+def to_arrow_table(type, data):
+    df = format_data(type, data)
+
+    if type == "long":
+        encoded_columns = ["food_type", "rating"]
+    else:
+        # Every second wide column is a <food_type>_rating column
+        encoded_columns = list(df.columns[1::2])
+
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            continue
+        # format_data pads the wide layout with "" for CSV
+        if type == "wide":
+            df[column] = df[column].mask(df[column] == "")
+        if column in encoded_columns:
+            df[column] = df[column].astype("category")
+
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+# Read an Arrow table from a path (memory mapped) or from bytes
+def read_table(source, binary_format):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = pa.BufferReader(source)
+        memory_map = False
+    else:
+        memory_map = isinstance(source, (str, os.PathLike))
+
+    if binary_format == "parquet":
+        return pq.read_table(source, memory_map=memory_map)
+    return feather.read_table(source, memory_map=memory_map)
+
+
+# Load a Parquet or Feather file (a path or bytes) in either layout and
+# build the foods dictionary.
+# Returns a tuple of (DataFrame, foods dictionary, format) as load_foods
+# does for a CSV file, adding any problems found to report
+def load_foods_binary(source, binary_format, progress=None, report=None):
+    df = read_table(source, binary_format).to_pandas()
+
+    # The foods dictionary holds plain strings, not categories
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(object)
+
+    csv_format = detect_format(df.columns)
+    if csv_format == "wide":
+        foods_dict = build_foods_dict(df, report=report)
+    else:
+        foods_dict = add_long_format_chunk({}, df, report)
+
+    if progress is not None:
+        progress(len(df), len(foods_dict))
+    return df, foods_dict, csv_format
+
+
+# Load a CSV, Parquet or Feather file by its name, file is a path or a
+# binary file object
+def load_file(name, file, progress=None, report=None):
+    binary_format = binary_file_format(name)
+    if binary_format is None:
+        return load_foods(file, progress=progress, report=report)
+    if hasattr(file, "getbuffer"):
+        file = file.getbuffer()
+    elif hasattr(file, "read"):
+        file = file.read()
+    return load_foods_binary(file, binary_format, progress, report)
+
+
+# Write the foods to a new versioned Parquet or Feather file in the long or
+# wide layout, atomically as write_csv does.
+# Returns a tuple of (success, error message, file path)
+def write_binary(file_prefix, type, data, binary_format,
+                 retention=output_retention):
+    success = False
+    error = ""
+    file_path = versioned_file_path(file_prefix,
+                                    extension=binary_formats[binary_format])
+    try:
+        table = to_arrow_table(type, data)
+        if binary_format == "parquet":
+            write_atomic(file_path,
+                         lambda binary_file: pq.write_table(table,
+                                                            binary_file))
+        else:
+            write_atomic(file_path,
+                         lambda binary_file: feather.write_feather(
+                             table, binary_file))
+        apply_retention(file_prefix, retention)
+        success = True
+    except FileNotFoundError:
+        error = f"Directory {os.path.dirname(file_path) or '.'} not found"
+    except Exception as e:
+        error = f"An error occurred: {e}"
+    return success, error, file_path
@@ -0,0 +1,286 @@
+import csv
+import gzip
+import io
+import os
+import re
+import tempfile
+import uuid
+from datetime import datetime
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from streamlit_in_steps.store import RatingStore
+
+# Export - Format the foods dictionary (or ratings store) as a DataFrame in
+# either the long or wide CSV format
+#
+# Each column is built as a single numpy array of its final length, so no
+# intermediate Python lists are created and any number of food types can
+# be written.
+#
+# CSV files are written by streaming rows straight from the foods
+# dictionary (or ratings store) in chunks, so a full DataFrame copy of the
+# data is never built when saving. Each save writes a new timestamped file
+# atomically and only the newest files are kept.
+
+# Number of CSV rows generated and written at a time
+export_chunk_rows = 50_000
+
+# Number of saved files kept for each output file prefix, older files are
+# deleted after each save. Step 5 adds the session id to the prefix so each
+# session keeps its own newest files
+output_retention = 10
+
+
+# Return the keys or values of a dictionary as a numpy object array
+def object_array(values, count):
+    return np.fromiter(values, dtype=object, count=count)
+
+
+def format_data(type, data):
+    formatted_data = []
+
+    # The ratings store builds both formats directly from its arrays
+    if isinstance(data, RatingStore):
+        if type == "long":
+            return data.to_long_frame()
+        elif type == "wide":
+            return data.to_wide_frame()
+        return formatted_data
+
+    # Long type format is a list of lists
+    # food_type, food, rating
+    # e.g.
+    # fruit, apple, like
+    # vegetable, carrot, dislike
+    if type == "long":
+        lengths = [len(food_ratings) for food_ratings in data.values()]
+        total = sum(lengths)
+
+        food_type_column = np.repeat(
+            object_array(data.keys(), len(data)), lengths)
+        food_column = np.empty(total, dtype=object)
+        rating_column = np.empty(total, dtype=object)
+
+        start = 0
+        for food_ratings, length in zip(data.values(), lengths):
+            food_column[start:start + length] = object_array(
+                food_ratings.keys(), length)
+            rating_column[start:start + length] = object_array(
+                food_ratings.values(), length)
+            start += length
+
+        # Create DataFrame
+        formatted_data = pd.DataFrame({
+            "food_type": food_type_column,
+            "food": food_column,
+            "rating": rating_column,
+        }, copy=False)
+
+    elif type == "wide":
+        # Wide type format is a shorter condensed format
+        # <food_type>, <food_type>_rating, <food_type>, <food_type>_rating etc
+        # e.g.
+        # fruit, fruit_rating, vegetable, vegetable_rating, meat, meat_rating
+        # orange, like, cabbage, dislike, beef, indifferent
+        #
+        # When categories have unequal lists of items empty cells are written
+        # e.g.
+        # apple, love,,, chicken, like
+        # Determine the maximum length of the lists in all categories
+        max_length = max(
+            (len(food_ratings) for food_ratings in data.values()),
+            default=0
+        )
+
+        # Each food type becomes a <food_type>, <food_type>_rating pair
+        # of columns in the same order as the dictionary. The columns are
+        # allocated at full length and filled with "" so shorter food
+        # types are padded without building padding lists
+        columns = {}
+        for food_type, food_ratings in data.items():
+            length = len(food_ratings)
+
+            food_column = np.full(max_length, "", dtype=object)
+            food_column[:length] = object_array(food_ratings.keys(), length)
+            columns[food_type] = food_column
+
+            rating_column = np.full(max_length, "", dtype=object)
+            rating_column[:length] = object_array(food_ratings.values(),
+                                                  length)
+            columns[f"{food_type}_rating"] = rating_column
+
+        formatted_data = pd.DataFrame(columns, copy=False)
+
+    return formatted_data
+
+
+# Return the number of data rows (excluding the header) in the CSV
+def count_rows(type, data):
+    lengths = [len(food_ratings) for food_ratings in data.values()]
+    if type == "long":
+        return sum(lengths)
+    return max(lengths, default=0)
+
+
+# Return the header row for the CSV
+def csv_header(type, data):
+    if type == "long":
+        return ["food_type", "food", "rating"]
+    header = []
+    for food_type in data.keys():
+        header += [food_type, f"{food_type}_rating"]
+    return header
+
+
+# Generate the data rows of the CSV in chunks of chunk_rows rows, each
+# chunk is a list of row tuples
+def iter_row_chunks(type, data, chunk_rows=export_chunk_rows):
+    if type == "long":
+        for food_type, food_ratings in data.items():
+            food_items = iter(food_ratings.items())
+            while chunk := list(islice(food_items, chunk_rows)):
+                yield [(food_type, food, rating) for food, rating in chunk]
+
+    elif type == "wide":
+        # Step through every food type together, shorter food types are
+        # padded with empty cells once they run out of foods
+        food_items = [iter(food_ratings.items())
+                      for food_ratings in data.values()]
+        total_rows = count_rows(type, data)
+        for start in range(0, total_rows, chunk_rows):
+            rows = min(chunk_rows, total_rows - start)
+            columns = []
+            for items in food_items:
+                chunk = list(islice(items, rows))
+                pad = [""] * (rows - len(chunk))
+                columns.append([food for food, rating in chunk] + pad)
+                columns.append([rating for food, rating in chunk] + pad)
+            yield list(zip(*columns))
+
+
+# Generate the CSV as text in chunks of chunk_rows rows, each chunk is a
+# tuple of (text, number of data rows). The header is the first chunk
+def iter_csv_chunks(type, data, chunk_rows=export_chunk_rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    writer.writerow(csv_header(type, data))
+    yield buffer.getvalue(), 0
+
+    for rows in iter_row_chunks(type, data, chunk_rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue(), len(rows)
+
+
+# Write the CSV chunks to a binary file, calling progress after each chunk
+def write_chunks(binary_file, type, data, progress=None):
+    total_rows = count_rows(type, data)
+    rows_written = 0
+    for text, rows in iter_csv_chunks(type, data):
+        binary_file.write(text.encode("utf-8"))
+        rows_written += rows
+        if progress is not None:
+            progress(rows_written, total_rows)
+
+
+# Return a new file path for the output file prefix, made unique by the
+# current time and a random suffix so concurrent saves never collide.
+# File names sort oldest to newest
+# e.g. output/food_ratings_20240315-101502-123456_1a2b3c4d.csv
+def versioned_file_path(file_prefix, compress=False, extension=".csv"):
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    if compress:
+        extension += ".gz"
+    return f"{file_prefix}_{timestamp}_{uuid.uuid4().hex[:8]}{extension}"
+
+
+# Delete the oldest saved files (of any file type) for the output file
+# prefix, keeping the newest retention files. Only files named by
+# versioned_file_path with exactly this prefix are counted, so files saved
+# with a longer prefix (e.g. by another session) are never deleted. Files
+# deleted by another session at the same time are ignored
+def apply_retention(file_prefix, retention=output_retention):
+    directory = os.path.dirname(file_prefix) or "."
+    saved_file_name = re.compile(
+        re.escape(os.path.basename(file_prefix))
+        + r"_\d{8}-\d{6}-\d{6}_[0-9a-f]{8}\.(csv(\.gz)?|parquet|feather)")
+
+    saved_files = sorted(name for name in os.listdir(directory)
+                         if saved_file_name.fullmatch(name))
+
+    for name in saved_files[:max(0, len(saved_files) - retention)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+# Flush a rename in the directory to disk, not supported on Windows
+def sync_directory(directory):
+    if os.name != "posix":
+        return
+    directory_file = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(directory_file)
+    finally:
+        os.close(directory_file)
+
+
+# Write a file atomically. write is called with a binary file object
+# (gzip compressed if compress is set) that it writes the content to.
+# The content is written to a temporary file in the same directory,
+# flushed to disk and then renamed into place so readers never see a
+# partially written file
+def write_atomic(file_path, write, compress=False):
+    directory = os.path.dirname(file_path) or "."
+    temp_file, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(file_path)}.",
+        suffix=".tmp")
+    try:
+        with open(temp_file, "wb") as raw_file:
+            if compress:
+                # Closing the gzip file does not close raw_file
+                with gzip.GzipFile(fileobj=raw_file, mode="wb") as gzip_file:
+                    write(gzip_file)
+            else:
+                write(raw_file)
+
+            raw_file.flush()
+            os.fsync(raw_file.fileno())
+
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    sync_directory(directory)
+
+
+# Stream the foods to a new versioned CSV file in the long or wide format,
+# optionally gzip compressed. progress is called after each chunk with the
+# number of rows written so far and the total number of rows.
+# The file is written atomically so other sessions never see a partially
+# written file.
+# Returns a tuple of (success, error message, file path)
+def write_csv(file_prefix, type, data, compress=False, progress=None,
+              retention=output_retention):
+    success = False
+    error = ""
+    file_path = versioned_file_path(file_prefix, compress)
+    try:
+        write_atomic(file_path,
+                     lambda csv_file: write_chunks(csv_file, type, data,
+                                                   progress),
+                     compress)
+        apply_retention(file_prefix, retention)
+        success = True
+    except FileNotFoundError:
+        error = f"Directory {os.path.dirname(file_path) or '.'} not found"
+    except Exception as e:
+        error = f"An error occurred: {e}"
+    return success, error, file_path
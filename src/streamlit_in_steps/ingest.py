@@ -0,0 +1,259 @@
+import numpy as np
+import pandas as pd
+
+from streamlit_in_steps.validation import (ValidationReport, default_rating,
+                                           normalize_names, normalize_ratings)
+
+# Ingest - Build the nested foods dictionary used by the Streamlit steps
+# from a DataFrame loaded from a CSV file
+#
+# The dictionary is organised by food type and then food/rating
+# e.g.
+# {"fruit": {"apple": "like", "banana": "love"}, "vegetable": {...}}
+#
+# The DataFrame is processed a column at a time rather than a row at a
+# time (df.iterrows) so that large files can be loaded quickly.
+#
+# Both CSV formats written by format_data are supported, the horizontal
+# (wide) format and the long format (food_type, food, rating). Files are
+# streamed in chunks so large files load in bounded memory.
+#
+# Every chunk is validated as it is folded into the dictionary (see
+# validation.py), names and ratings are normalised so every loaded rating
+# is one of the allowed ratings, and the problems found are collected in a
+# ValidationReport.
+
+# Suffix that identifies the rating column paired with a food type column
+# e.g. "fruit" is paired with "fruit_rating"
+rating_suffix = "_rating"
+
+
+# Read the header once and pair every <food_type> column with its
+# <food_type>_rating column. Food types are returned in header order and
+# the rating column is None when the file only contains the food column
+# e.g.
+# ["fruit", "fruit_rating", "meat"]
+# -> {"fruit": "fruit_rating", "meat": None}
+def discover_food_types(columns):
+    column_set = set(columns)
+
+    food_types = {}
+    for column in columns:
+        if column.endswith(rating_suffix):
+            continue
+        rating_column = column + rating_suffix
+        food_types[column] = (rating_column if rating_column in column_set
+                              else None)
+
+    return food_types
+
+
+# Add the foods of a food type, arrays of names and ratings read from the
+# rows, to the foods dictionary. Zipping the arrays keeps the dictionary
+# semantics of a row by row approach, a repeated food keeps its first
+# position and takes the rating from its last row. Repeated foods are
+# counted from the dictionary sizes and only located when there are some
+def add_foods(foods_dict, food_type, foods, food_ratings, rows, report):
+    added = dict(zip(foods.tolist(), food_ratings.tolist()))
+    existing = foods_dict.get(food_type)
+
+    repeated = len(foods) - len(added)
+    if existing:
+        repeated += len(added.keys() & existing.keys())
+    if repeated:
+        duplicate = pd.Series(foods).duplicated().to_numpy()
+        if existing:
+            duplicate |= np.fromiter((food in existing for food in foods),
+                                     dtype=bool, count=len(foods))
+        report.add("duplicate food (last rating kept)", rows[duplicate],
+                   foods[duplicate])
+
+    if existing is None:
+        foods_dict[food_type] = added
+    else:
+        existing.update(added)
+
+
+# Build the foods dictionary for every food type in the horizontal format
+# DataFrame in a single pass. The food columns and rating columns are each
+# taken as one block so the normalisation (see validation.py) and missing
+# value checks run once over the whole frame rather than once per food
+# type.
+# Rows without a food are dropped, foods without a rating or with an
+# unknown rating are given the default rating and if the rating column is
+# missing entirely every food is given the default rating. The foods are
+# added to foods_dict, if given, and any problems to report
+def build_foods_dict(df, foods_dict=None, report=None):
+    food_types = discover_food_types(df.columns)
+    if report is None:
+        report = ValidationReport()
+
+    # Initialise a foods dictionary which
+    # is a nested dictionary by food type and then food/rating
+    if foods_dict is None:
+        foods_dict = {}
+    if not food_types:
+        return foods_dict
+
+    rows = df.index.to_numpy() + 1
+
+    # Column (Fortran) ordered so each food type is a contiguous slice
+    shape = (len(df), len(food_types))
+    foods, missing_food, fixed_foods = (
+        values.reshape(shape, order="F") for values in normalize_names(
+            df[list(food_types)].to_numpy(dtype=object).ravel(order="F")))
+
+    food_ratings = np.full(shape, default_rating, dtype=object, order="F")
+    missing_rating = np.zeros(shape, dtype=bool, order="F")
+    fixed_rating = np.zeros(shape, dtype=bool, order="F")
+    unknown_rating = np.zeros(shape, dtype=bool, order="F")
+    rated = [position for position, rating_column
+             in enumerate(food_types.values()) if rating_column is not None]
+    if rated:
+        rating_columns = [rating_column for rating_column
+                          in food_types.values() if rating_column is not None]
+        raw_ratings = df[rating_columns].to_numpy(dtype=object)
+        normalized = normalize_ratings(raw_ratings.ravel(order="F"))
+        for block, values in zip([food_ratings, missing_rating,
+                                  fixed_rating, unknown_rating], normalized):
+            block[:, rated] = values.reshape(raw_ratings.shape, order="F")
+
+    for position, food_type in enumerate(food_types):
+        has_food = ~missing_food[:, position]
+        # A missing food in the padding below a shorter food type has no
+        # rating either
+        orphan = missing_food[:, position] & ~missing_rating[:, position]
+        if food_types[food_type] is not None:
+            report.add("rating without a food (skipped)", rows[orphan])
+
+        report.add("food name whitespace fixed",
+                   rows[fixed_foods[:, position] & has_food])
+        report.add("missing rating (set to review)",
+                   rows[missing_rating[:, position] & has_food])
+        report.add("rating case or whitespace fixed",
+                   rows[fixed_rating[:, position] & has_food])
+        unknown = unknown_rating[:, position] & has_food
+        report.add("unknown rating (set to review)", rows[unknown],
+                   df[food_types[food_type]].to_numpy()[unknown]
+                   if unknown.any() else None)
+
+        add_foods(foods_dict, food_type, foods[has_food, position],
+                  food_ratings[has_food, position], rows[has_food], report)
+
+    return foods_dict
+
+
+# Columns written by format_data(type="long") and expected when loading a
+# long format CSV
+long_format_columns = ["food_type", "food", "rating"]
+
+# Number of rows read at a time when loading a long format CSV
+long_format_chunksize = 100_000
+
+
+# Determine the format of a CSV from its header, a long format file has
+# food_type and food columns, anything else is treated as the
+# horizontal (wide) format
+def detect_format(columns):
+    if "food_type" in columns and "food" in columns:
+        return "long"
+    return "wide"
+
+
+# Fold one chunk of a long format DataFrame into the foods dictionary.
+# Food types, foods and ratings are normalised as build_foods_dict does,
+# rows without a food type or food are dropped, foods without a rating or
+# with an unknown rating are given the default rating and if the rating
+# column is missing entirely every food is given the default rating
+def add_long_format_chunk(foods_dict, chunk, report=None):
+    if report is None:
+        report = ValidationReport()
+
+    rows = chunk.index.to_numpy() + 1
+    food_types, missing_type, fixed_types = normalize_names(
+        chunk["food_type"])
+    foods, missing_food, fixed_foods = normalize_names(chunk["food"])
+    keep = ~(missing_type | missing_food)
+    report.add("missing food type or food (skipped)", rows[~keep])
+    report.add("food name whitespace fixed",
+               rows[(fixed_types | fixed_foods) & keep])
+
+    if "rating" in chunk.columns:
+        food_ratings, missing, fixed, unknown = normalize_ratings(
+            chunk["rating"])
+        report.add("missing rating (set to review)", rows[missing & keep])
+        report.add("rating case or whitespace fixed", rows[fixed & keep])
+        report.add("unknown rating (set to review)", rows[unknown & keep],
+                   chunk["rating"].to_numpy()[unknown & keep])
+    else:
+        food_ratings = np.full(len(chunk), default_rating, dtype=object)
+
+    chunk = pd.DataFrame({"food_type": food_types[keep],
+                          "food": foods[keep],
+                          "rating": food_ratings[keep]}, index=rows[keep])
+
+    # sort=False keeps the food types in the order they appear in the file
+    for food_type, group in chunk.groupby("food_type", sort=False):
+        add_foods(foods_dict, food_type, group["food"].to_numpy(),
+                  group["rating"].to_numpy(), group.index.to_numpy(), report)
+
+    return foods_dict
+
+
+# Build the foods dictionary from an iterable of long format DataFrame
+# chunks, only one chunk is held in memory at a time
+def build_foods_dict_long(chunks, report=None):
+    foods_dict = {}
+    for chunk in chunks:
+        add_long_format_chunk(foods_dict, chunk, report)
+    return foods_dict
+
+
+# Load a CSV file (a path or file-like object) in either format and build
+# the foods dictionary.
+# Returns a tuple of (preview DataFrame, foods dictionary, format)
+# Both formats are read in chunks of chunksize rows and progress, if given,
+# is called after each chunk with the number of rows read and food types
+# found so far. An exception raised by progress stops the load.
+# Problems found while validating the rows are added to report, if given.
+# The preview of a wide format file is the full DataFrame, the preview of
+# a long format file is the first chunk so it is loaded in bounded memory
+def load_foods(file, chunksize=long_format_chunksize, progress=None,
+               report=None):
+    header = pd.read_csv(file, nrows=0).columns
+    if hasattr(file, "seek"):
+        file.seek(0)
+    csv_format = detect_format(header)
+
+    foods_dict = {}
+    chunks = []
+    rows = 0
+    # Every column is read as text, so a food named 101 is the same food
+    # however it was read (and not 101.0 in a column with empty cells)
+    with pd.read_csv(file, chunksize=chunksize, dtype=str) as reader:
+        for chunk in reader:
+            if csv_format == "wide":
+                # dict.update keeps the first position and last rating of a
+                # food repeated across chunks
+                chunks.append(chunk)
+                build_foods_dict(chunk, foods_dict, report)
+            else:
+                if not chunks:
+                    chunks.append(chunk)
+                add_long_format_chunk(foods_dict, chunk, report)
+            rows += len(chunk)
+            if progress is not None:
+                progress(rows, len(foods_dict))
+
+    if csv_format == "wide" and not chunks:
+        # A header only file still has its food types
+        foods_dict = build_foods_dict(pd.DataFrame(columns=header))
+
+    if len(chunks) > 1:
+        preview = pd.concat(chunks)
+    elif chunks:
+        preview = chunks[0]
+    else:
+        preview = pd.DataFrame(columns=header)
+
+    return preview, foods_dict, csv_format
@@ -0,0 +1,145 @@
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+from streamlit_in_steps.export import write_atomic, write_chunks
+from streamlit_in_steps.ingest import load_foods
+
+# Journal - An append only autosave journal of rating changes for a session
+#
+# Every rating change and every added food is appended to the journal as
+# one JSON line:
+# {"food_type": "fruit", "food": "apple", "rating": "like",
+#  "time": "2024-03-15T10:15:02.123456+00:00"}
+#
+# After compact_every records the journal is compacted, the full set of
+# ratings is written as a long format snapshot CSV and the journal is
+# emptied. A session is rebuilt by applying the snapshot and then the
+# journal, so the cost of each autosave is one small record regardless of
+# the size of the data.
+#
+# Journals are named by session id and the hash of the loaded CSV so a
+# session is only rebuilt from a journal for the same file.
+#
+# A session's journal and snapshot are deleted once neither has been
+# written for journal_max_age seconds, so the journals of sessions that
+# never come back do not pile up.
+
+# Number of journal records written before the journal is compacted
+journal_compact_every = 500
+
+# Seconds after the last change to a session's ratings that its journal
+# and snapshot are kept
+journal_max_age = 7 * 24 * 60 * 60
+
+# Suffixes of the journal and snapshot files
+journal_suffixes = (".jsonl", ".snapshot.csv")
+
+
+# Delete the journals and snapshots in the directory that have not been
+# written for max_age seconds, a journal and its snapshot are kept or
+# deleted together. Files deleted by another session at the same time are
+# ignored. Returns the number of files deleted
+def remove_old_journals(directory, max_age=journal_max_age, now=None):
+    now = time.time() if now is None else now
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+
+    # Paths and the newest write time of each session's files, by name
+    sessions = {}
+    for entry in entries:
+        suffix = next((suffix for suffix in journal_suffixes
+                       if entry.name.endswith(suffix)), None)
+        if suffix is None:
+            continue
+        try:
+            modified = entry.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        name = entry.name[:-len(suffix)]
+        paths, newest = sessions.get(name, ([], 0))
+        sessions[name] = (paths + [entry.path], max(newest, modified))
+
+    removed = 0
+    for paths, newest in sessions.values():
+        if now - newest < max_age:
+            continue
+        for path in paths:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+class RatingJournal:
+    def __init__(self, directory, session_id, file_hash,
+                 compact_every=journal_compact_every):
+        name = f"{session_id}_{file_hash[:16]}"
+        self.journal_path = os.path.join(directory, f"{name}.jsonl")
+        self.snapshot_path = os.path.join(directory, f"{name}.snapshot.csv")
+        self.compact_every = compact_every
+        self.records = 0
+        self.store = None
+        os.makedirs(directory, exist_ok=True)
+
+    # True if there is a snapshot or journal to rebuild a session from
+    def exists(self):
+        return (os.path.exists(self.snapshot_path)
+                or os.path.exists(self.journal_path))
+
+    # Apply the snapshot and then the journal to the ratings store.
+    # A partly written last record (e.g. after a crash) is skipped
+    def replay(self, store):
+        if os.path.exists(self.snapshot_path):
+            snapshot, foods, csv_format = load_foods(self.snapshot_path)
+            for food_type, food_ratings in foods.items():
+                food_type_ratings = store.setdefault(food_type, {})
+                for food, rating in food_ratings.items():
+                    food_type_ratings[food] = rating
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding="utf-8") as journal_file:
+                for line in journal_file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    food_type_ratings = store.setdefault(record["food_type"],
+                                                         {})
+                    food_type_ratings[record["food"]] = record["rating"]
+                    self.records += 1
+
+    # Start journalling every change made to the ratings store
+    def attach(self, store):
+        self.store = store
+        store.listeners.append(self.record)
+
+    # Store listener, appends one record for a changed or added food
+    def record(self, food_type, food, old_rating, new_rating):
+        record = {
+            "food_type": food_type,
+            "food": food,
+            "rating": new_rating,
+            "time": datetime.now(timezone.utc).isoformat(),
+        }
+        with open(self.journal_path, "a", encoding="utf-8") as journal_file:
+            journal_file.write(json.dumps(record, default=str) + "\n")
+        self.records += 1
+
+        if self.records >= self.compact_every:
+            self.compact()
+
+    # Write the attached store as a snapshot and empty the journal.
+    # The snapshot is written before the journal is emptied, replaying a
+    # journal over a snapshot that already includes it gives the same result
+    def compact(self):
+        write_atomic(self.snapshot_path,
+                     lambda snapshot_file: write_chunks(snapshot_file, "long",
+                                                        self.store))
+        open(self.journal_path, "w").close()
+        self.records = 0
@@ -0,0 +1,201 @@
+import io
+import mmap
+import os
+import re
+from concurrent import futures
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from streamlit_in_steps.cache import content_hash
+from streamlit_in_steps.columnar import binary_file_format, load_file
+from streamlit_in_steps.validation import ValidationReport, default_rating
+
+# Merge - Parse several CSV (or Parquet/Feather) files in parallel and
+# merge them into a single foods dictionary
+#
+# A file is given as (name, source) where the source is the uploaded bytes
+# or the path of a file on the server. A server CSV file is memory mapped
+# and a server Parquet/Feather file is memory mapped by Arrow, so it is
+# read from the page cache without first being copied into memory.
+#
+# Each file is parsed on a worker thread with load_file (or in turn on the
+# calling thread when there is no executor), pandas releases the GIL while
+# it tokenises a CSV and Arrow while it reads a Parquet/Feather file. The
+# foods dictionaries are then merged one food type at a time with
+# dict.update so the merge is linear in the total number of rows. Food
+# types and foods keep the order they are first seen in.
+#
+# When more than one file rates the same food the merge policy decides
+# which rating is kept:
+# - "last wins"      the file uploaded last wins
+# - "most recent"    the file with the newest timestamp in its name wins,
+#                    e.g. food_ratings_<session id>_20240315-101502-123456
+#                    _1a2b3c4d.csv as written by step 5. Files without a
+#                    timestamp are older than any file with one
+# - "prefer rated"   the file uploaded last wins unless its rating is
+#                    "review" and another file has rated the food
+
+merge_policies = ["last wins", "most recent", "prefer rated"]
+
+# Ratings that mean a food has not been rated yet, the files are validated
+# before they are merged so a food without a rating has the default rating
+review_ratings = {default_rating}
+
+timestamp_pattern = re.compile(r"(\d{8}-\d{6})(?:-(\d{6}))?")
+
+
+# Return the timestamp in a file name, or None if it has none
+def file_timestamp(name):
+    match = timestamp_pattern.search(name)
+    if match is None:
+        return None
+    try:
+        timestamp = datetime.strptime(match.group(1), "%Y%m%d-%H%M%S")
+    except ValueError:
+        return None
+    return timestamp.replace(microsecond=int(match.group(2) or 0))
+
+
+# Return the size in bytes of a file source
+def source_size(source):
+    if isinstance(source, bytes):
+        return len(source)
+    return os.path.getsize(source)
+
+
+# Return a hash identifying a file source. A server file is identified by
+# its path, size and modification time rather than by hashing its contents
+# so it is not read to find out whether it has changed
+def source_hash(source):
+    if isinstance(source, bytes):
+        return content_hash(source)
+    stat = os.stat(source)
+    return content_hash(f"{os.path.abspath(source)}:{stat.st_size}:"
+                        f"{stat.st_mtime_ns}".encode())
+
+
+# Open a file source for load_file. Bytes are wrapped in a file object, a
+# CSV path is memory mapped and a Parquet/Feather path is left for Arrow to
+# memory map
+@contextmanager
+def open_source(name, source):
+    if isinstance(source, bytes):
+        yield io.BytesIO(source)
+    elif binary_file_format(name) is not None:
+        yield source
+    else:
+        with open(source, "rb") as file:
+            # An empty file cannot be memory mapped
+            if os.fstat(file.fileno()).st_size == 0:
+                yield file
+                return
+            with mmap.mmap(file.fileno(), 0,
+                           access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+
+# Run on a worker thread, parse one file and return
+# (preview DataFrame, foods dictionary, format, rows, validation report)
+def parse_file(name, source):
+    rows = 0
+    report = ValidationReport()
+
+    def count_rows(rows_read, food_types):
+        nonlocal rows
+        rows = rows_read
+
+    with open_source(name, source) as file:
+        preview, foods, csv_format = load_file(name, file,
+                                               progress=count_rows,
+                                               report=report)
+    return preview, foods, csv_format, rows, report
+
+
+# Merge foods dictionaries, given in upload order as (name, foods), into a
+# single foods dictionary using the merge policy
+def merge_foods(named_foods, policy="last wins"):
+    if policy not in merge_policies:
+        raise ValueError(f"Unknown merge policy {policy!r}")
+
+    if policy == "most recent":
+        # sorted is stable so files with equal timestamps keep upload order
+        named_foods = sorted(named_foods, key=lambda named: (
+            file_timestamp(named[0]) or datetime.min))
+
+    merged = {}
+    for name, foods in named_foods:
+        for food_type, food_ratings in foods.items():
+            merged_ratings = merged.setdefault(food_type, {})
+            if policy == "prefer rated":
+                for food, rating in food_ratings.items():
+                    if (rating not in review_ratings
+                            or food not in merged_ratings):
+                        merged_ratings[food] = rating
+            else:
+                merged_ratings.update(food_ratings)
+    return merged
+
+
+# Parse the files, a list of (name, source), and merge them.
+# A single file is parsed on the calling thread with a progress update per
+# chunk, several files are parsed in parallel on the executor (or
+# one after another if executor is None) with a progress update per file.
+# progress is called with (rows, food types, bytes parsed) and an
+# exception raised by it cancels the files still waiting to be parsed.
+# The problems found in each file are added to report, if given.
+# Returns a tuple of (preview DataFrame, foods dictionary, format) where
+# the format is "mixed" when the files are in different formats
+def parse_files(files, progress, executor, policy="last wins",
+                report=None):
+    if len(files) == 1:
+        name, source = files[0]
+        with open_source(name, source) as file:
+            # Arrow reads a Parquet/Feather path in one go
+            if isinstance(file, str):
+                def position():
+                    return source_size(source)
+            else:
+                position = file.tell
+            return load_file(name, file, progress=lambda rows, food_types:
+                             progress(rows, food_types, position()),
+                             report=report)
+
+    pending = {}
+    if executor is None:
+        completed = ((position, parse_file(name, source))
+                     for position, (name, source) in enumerate(files))
+    else:
+        pending = {executor.submit(parse_file, name, source): position
+                   for position, (name, source) in enumerate(files)}
+        completed = ((pending[future], future.result())
+                     for future in futures.as_completed(pending))
+
+    parsed = [None] * len(files)
+    rows = 0
+    bytes_parsed = 0
+    food_types = set()
+    try:
+        for position, file_parsed in completed:
+            parsed[position] = file_parsed
+            rows += parsed[position][3]
+            bytes_parsed += source_size(files[position][1])
+            food_types.update(parsed[position][1])
+            progress(rows, len(food_types), bytes_parsed)
+    except BaseException:
+        for future in pending:
+            future.cancel()
+        raise
+
+    names = [name for name, source in files]
+    if report is not None:
+        for name, file_parsed in zip(names, parsed):
+            report.extend(file_parsed[4], name)
+    foods = merge_foods([(name, file_parsed[1])
+                         for name, file_parsed in zip(names, parsed)], policy)
+    preview = pd.concat([file_parsed[0] for file_parsed in parsed],
+                        keys=names, names=["file", None])
+    csv_formats = {file_parsed[2] for file_parsed in parsed}
+    csv_format = csv_formats.pop() if len(csv_formats) == 1 else "mixed"
+    return preview, foods, csv_format
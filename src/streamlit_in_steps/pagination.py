@@ -0,0 +1,25 @@
+import math
+
+# Pagination - Helpers to show a large list of foods a page at a time so
+# only the visible foods are rendered as widgets on each rerun
+
+
+# Return the foods whose name contains the search text (case insensitive),
+# an empty search returns every food
+def filter_foods(foods, search):
+    search = search.strip().lower()
+    if not search:
+        return list(foods)
+    return [food for food in foods if search in str(food).lower()]
+
+
+# Return the number of pages needed to show total items, there is always
+# at least one page so an empty list still has a page to display
+def page_count(total, page_size):
+    return max(1, math.ceil(total / page_size))
+
+
+# Return the items on the given page, pages are numbered from 1
+def page_slice(items, page, page_size):
+    start = (page - 1) * page_size
+    return items[start:start + page_size]
@@ -0,0 +1,163 @@
+import cProfile
+import glob
+import os
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Profiling - Opt in timing of each phase of a rerun (parsing, building
+# the ratings, rendering panels, writing CSV files)
+#
+# Each phase records its wall time (time.perf_counter) in a rolling
+# history of the last profile_history runs of the phase, and with
+# trace_memory the peak memory allocated while it ran (tracemalloc).
+# Phases can be nested, an outer phase's peak includes the peaks of the
+# phases inside it.
+#
+# tracemalloc is process wide, it slows every allocation of every session
+# and its peak is shared by every thread, so memory is only traced when
+# the server is started with it switched on (never from a browser) and
+# allocations made by other sessions running at the same time are counted
+# too.
+#
+# A whole rerun can also be profiled with cProfile, the stats of the last
+# dump_reruns reruns are kept as .prof files that can be read with pstats
+# or snakeviz.
+
+# Number of runs of each phase kept in the history
+profile_history = 100
+
+# Directory the cProfile dumps are written to
+profile_directory = "output/profiles"
+
+
+class PhaseProfiler:
+    def __init__(self, enabled=True, history=profile_history, dump_reruns=0,
+                 dump_directory=profile_directory, trace_memory=False):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.history = history
+        self.dump_reruns = dump_reruns
+        self.dump_directory = dump_directory
+        self.timings = {}
+        # [phase, start time, memory traced at the start, peak so far] for
+        # each phase that is running
+        self._running = []
+        self._profile = None
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    # Time the code run inside the with block as the named phase
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    # Start timing a full rerun of the script, a rerun ended by st.stop()
+    # or an exception is dropped when the next one starts
+    def start_rerun(self):
+        if not self.enabled:
+            return
+        self._running = []
+        self._stop_profile()
+        if self.dump_reruns:
+            self._profile = cProfile.Profile()
+            try:
+                self._profile.enable()
+            except ValueError:
+                # Another session is already being profiled
+                self._profile = None
+        self._enter("rerun")
+
+    def end_rerun(self):
+        if not self.enabled or not self._running:
+            return
+        profile = self._stop_profile()
+        self._exit()
+        if profile is not None:
+            self._dump(profile)
+
+    # Return the traced memory and its peak, both 0 when memory is not
+    # traced
+    def _traced_memory(self):
+        if not self.trace_memory:
+            return 0, 0
+        return tracemalloc.get_traced_memory()
+
+    def _enter(self, name):
+        current, peak = self._traced_memory()
+        if self._running:
+            self._running[-1][3] = max(self._running[-1][3], peak)
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self._running.append([name, time.perf_counter(), current, current])
+
+    def _exit(self):
+        name, start, start_memory, peak = self._running.pop()
+        peak = max(peak, self._traced_memory()[1])
+        if self._running:
+            self._running[-1][3] = max(self._running[-1][3], peak)
+
+        runs = self.timings.setdefault(name, deque(maxlen=self.history))
+        runs.append(((time.perf_counter() - start) * 1000,
+                     (peak - start_memory) / 1024))
+
+    def _stop_profile(self):
+        profile, self._profile = self._profile, None
+        if profile is not None:
+            profile.disable()
+        return profile
+
+    # Write the rerun's stats and remove all but the newest dump_reruns
+    def _dump(self, profile):
+        os.makedirs(self.dump_directory, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        profile.dump_stats(os.path.join(self.dump_directory,
+                                        f"rerun_{timestamp}.prof"))
+        dumps = sorted(glob.glob(os.path.join(self.dump_directory,
+                                              "rerun_*.prof")))
+        for dump in dumps[:-self.dump_reruns]:
+            try:
+                os.remove(dump)
+            except OSError:
+                pass
+
+    # Summary of the history with a row per phase, peak KB is only included
+    # when memory is traced
+    def summary(self):
+        rows = []
+        for name, runs in self.timings.items():
+            times = np.array([run[0] for run in runs])
+            allocated = np.array([run[1] for run in runs])
+            row = {
+                "phase": name,
+                "runs": len(runs),
+                "last ms": times[-1],
+                "p50 ms": np.percentile(times, 50),
+                "p95 ms": np.percentile(times, 95),
+                "max ms": times.max(),
+            }
+            if self.trace_memory:
+                row["peak KB"] = allocated.max()
+            rows.append(row)
+        return pd.DataFrame(rows).set_index("phase") if rows else None
+
+    # Histogram of the recorded times of a phase as a DataFrame with the
+    # number of runs in each time bin, indexed by the start of the bin
+    def histogram(self, name, bins=10):
+        times = [run[0] for run in self.timings.get(name, [])]
+        counts, edges = np.histogram(times, bins=bins)
+        return pd.DataFrame({"runs": counts},
+                            index=pd.Index(edges[:-1].round(1), name="ms"))
@@ -0,0 +1,201 @@
+from bisect import bisect_left
+
+import numpy as np
+
+# Search - Find foods by name across every food type
+#
+# A SearchIndex is built once when a file is loaded and never changes, so
+# one index is shared by every session that loads the same file. It holds:
+# - the lower case food names in sorted order, a prefix search is a
+#   binary search into them
+# - an n-gram (trigram) index of the entries containing each 3 character
+#   sequence, a substring search only checks the entries containing every
+#   trigram of the search text
+# Searches shorter than a trigram scan the names until enough matches are
+# found.
+#
+# A FoodSearch adds the foods a session adds to the shared index, it is
+# attached to the session's ratings store as a listener so each added food
+# is indexed as it is added.
+
+# Length of the n-grams in the substring index
+ngram_size = 3
+
+# Maximum number of matches returned by a search
+search_limit = 100
+
+# Unicode code points fit in 21 bits, so a trigram fits in one int64
+code_point_bits = 21
+
+
+# Return the lower case search key for a food name
+def search_key(food):
+    return str(food).lower()
+
+
+# Return the code points of the keys joined together and the length of
+# each key
+def code_points(keys):
+    lengths = np.fromiter(map(len, keys), dtype=np.int64, count=len(keys))
+    chars = np.frombuffer("".join(keys).encode("utf-32-le"),
+                          dtype=np.uint32).astype(np.int64)
+    return chars, lengths
+
+
+# Return the n-gram starting at each of the positions in chars as an int64
+def ngram_codes(chars, positions):
+    codes = np.zeros(len(positions), dtype=np.int64)
+    for offset in range(ngram_size):
+        codes = (codes << code_point_bits) | chars[positions + offset]
+    return codes
+
+
+class SearchIndex:
+    def __init__(self, foods):
+        self.food_types = list(foods)
+        names = []
+        type_codes = []
+        for code, food_ratings in enumerate(foods.values()):
+            food_names = list(food_ratings)
+            names += food_names
+            type_codes.append(np.full(len(food_names), code, dtype=np.int32))
+
+        self.names = names
+        self.type_codes = (np.concatenate(type_codes) if type_codes
+                           else np.array([], dtype=np.int32))
+        self.keys = [search_key(name) for name in names]
+
+        # Entries in search key order for prefix searches
+        self.order = sorted(range(len(self.keys)), key=self.keys.__getitem__)
+        self.sorted_keys = [self.keys[entry] for entry in self.order]
+
+        self._build_ngrams()
+
+    # Build the n-gram index with array operations over every key at once.
+    # The index is the distinct n-grams in order (ngrams), the entries
+    # containing them sorted by n-gram then entry (ngram_entries) and the
+    # start of each n-gram's entries (ngram_starts)
+    def _build_ngrams(self):
+        chars, lengths = code_points(self.keys)
+        key_ends = np.cumsum(lengths)
+        entries = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+
+        # An n-gram starts at every position with a full n-gram left in its
+        # key
+        positions = np.flatnonzero(np.arange(len(chars)) + ngram_size
+                                   <= np.repeat(key_ends, lengths))
+        codes = ngram_codes(chars, positions)
+        entries = entries[positions]
+
+        # Entries are already ascending, a stable sort keeps them so
+        order = np.argsort(codes, kind="stable")
+        codes = codes[order]
+        entries = entries[order]
+
+        # Drop an n-gram repeated within the same key
+        distinct = np.ones(len(codes), dtype=bool)
+        distinct[1:] = ((codes[1:] != codes[:-1])
+                        | (entries[1:] != entries[:-1]))
+        codes = codes[distinct]
+        self.ngram_entries = entries[distinct]
+
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]
+                                if len(codes) else [])
+        self.ngrams = codes[starts]
+        self.ngram_starts = np.append(starts, len(codes))
+
+    def __len__(self):
+        return len(self.names)
+
+    # Return the (food_type, food) of an entry
+    def entry(self, entry):
+        return (self.food_types[self.type_codes[entry]], self.names[entry])
+
+    # Return the entries whose key starts with text in key order
+    def prefix(self, text, limit=search_limit):
+        start = bisect_left(self.sorted_keys, text)
+        matches = []
+        for position in range(start, min(start + limit,
+                                         len(self.sorted_keys))):
+            if not self.sorted_keys[position].startswith(text):
+                break
+            matches.append(self.order[position])
+        return matches
+
+    # Return the entries containing every n-gram of text, in entry order
+    def _candidates(self, text):
+        chars, lengths = code_points([text])
+        codes = np.unique(ngram_codes(
+            chars, np.arange(len(text) - ngram_size + 1)))
+        found = np.searchsorted(self.ngrams, codes)
+        postings = []
+        for code, position in zip(codes, found):
+            if position == len(self.ngrams) or self.ngrams[position] != code:
+                return np.array([], dtype=np.int32)
+            postings.append(self.ngram_entries[
+                self.ngram_starts[position]:self.ngram_starts[position + 1]])
+
+        # Intersect the smallest posting lists first
+        postings.sort(key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            candidates = np.intersect1d(candidates, posting,
+                                        assume_unique=True)
+        return candidates
+
+    # Return the entries whose key contains text but does not start with it
+    # in entry order
+    def substring(self, text, limit=search_limit):
+        if len(text) < ngram_size:
+            candidates = range(len(self.keys))
+        else:
+            candidates = self._candidates(text).tolist()
+
+        matches = []
+        for entry in candidates:
+            key = self.keys[entry]
+            # Containing every n-gram does not guarantee a match, e.g. "aaaa"
+            # is not in "aaa"
+            if text in key and not key.startswith(text):
+                matches.append(entry)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+
+class FoodSearch:
+    def __init__(self, index):
+        self.index = index
+        # (food_type, food, key) of each food added in this session
+        self.added = []
+
+    # Index every food added to the ratings store from now on
+    def attach(self, store):
+        store.listeners.append(self.record)
+
+    # Store listener, indexes an added food (old_rating is None)
+    def record(self, food_type, food, old_rating, new_rating):
+        if old_rating is None:
+            self.added.append((food_type, food, search_key(food)))
+
+    # Return up to limit (food_type, food) pairs whose name contains the
+    # search text, names that start with it come first
+    def search(self, text, limit=search_limit):
+        text = search_key(text.strip())
+        if not text:
+            return []
+
+        added_prefix = [(food_type, food) for food_type, food, key
+                        in self.added if key.startswith(text)]
+        added_substring = [(food_type, food) for food_type, food, key
+                           in self.added
+                           if text in key and not key.startswith(text)]
+
+        matches = [self.index.entry(entry)
+                   for entry in self.index.prefix(text, limit)]
+        matches += added_prefix
+        if len(matches) < limit:
+            matches += [self.index.entry(entry) for entry
+                        in self.index.substring(text, limit - len(matches))]
+            matches += added_substring
+        return matches[:limit]
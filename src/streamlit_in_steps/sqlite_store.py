@@ -0,0 +1,167 @@
+import sqlite3
+from datetime import datetime, timezone
+
+# SQLite Store - An optional persistent store for ratings shared by every
+# user of the app, using the sqlite3 module from the standard library
+#
+# Ratings are kept in one table with a (dataset, user, food_type, food)
+# primary key, the dataset is the hash of the loaded file(s) so a user's
+# ratings of one file never leak into another file. An index on (dataset,
+# rating) serves queries across all users of a dataset. The database runs
+# in WAL mode so many sessions can read while one writes.
+#
+# A RatingStore is read from the database when a CSV is loaded and written
+# through to it, changes are collected by a store listener and written in
+# one transaction per batch rather than one per change.
+
+# Number of rows written to the database in each executemany call
+sqlite_batch_rows = 10_000
+
+create_table_sql = """
+CREATE TABLE IF NOT EXISTS ratings (
+    dataset TEXT NOT NULL,
+    user TEXT NOT NULL,
+    food_type TEXT NOT NULL,
+    food TEXT NOT NULL,
+    rating TEXT NOT NULL,
+    updated TEXT NOT NULL,
+    PRIMARY KEY (dataset, user, food_type, food)
+) WITHOUT ROWID
+"""
+
+create_index_sql = """
+CREATE INDEX IF NOT EXISTS ratings_by_dataset_rating
+ON ratings (dataset, rating)
+"""
+
+upsert_sql = """
+INSERT INTO ratings (dataset, user, food_type, food, rating, updated)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (dataset, user, food_type, food)
+DO UPDATE SET rating = excluded.rating, updated = excluded.updated
+"""
+
+# Only adds ratings that are not in the database yet
+insert_missing_sql = """
+INSERT INTO ratings (dataset, user, food_type, food, rating, updated)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (dataset, user, food_type, food) DO NOTHING
+"""
+
+
+# Open a connection to the database, creating the ratings table if needed
+def connect(path):
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    with connection:
+        connection.execute(create_table_sql)
+        connection.execute(create_index_sql)
+    return connection
+
+
+# Return the number of users with ratings for the dataset and the count of
+# each rating across them as a tuple of (users, [(rating, count), ...])
+def dataset_totals(path, dataset):
+    connection = connect(path)
+    try:
+        users = connection.execute(
+            "SELECT COUNT(DISTINCT user) FROM ratings WHERE dataset = ?",
+            (dataset,)).fetchone()[0]
+        counts = connection.execute(
+            "SELECT rating, COUNT(*) FROM ratings WHERE dataset = ? "
+            "GROUP BY rating ORDER BY rating", (dataset,)).fetchall()
+    finally:
+        connection.close()
+    return users, counts
+
+
+class SQLiteRatings:
+    def __init__(self, path, user, dataset, batch_rows=sqlite_batch_rows):
+        self.path = path
+        self.user = user
+        self.dataset = dataset
+        self.batch_rows = batch_rows
+        self._pending = {}
+
+        # Streamlit may run a session's reruns on different threads, the
+        # connection is only ever used by one session at a time
+        self._connection = connect(path)
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    # Apply the user's ratings of the dataset from the database to the
+    # ratings store
+    def load(self, store):
+        cursor = self._connection.execute(
+            "SELECT food_type, food, rating FROM ratings "
+            "WHERE dataset = ? AND user = ?", (self.dataset, self.user))
+        while rows := cursor.fetchmany(self.batch_rows):
+            for food_type, food, rating in rows:
+                store.setdefault(food_type, {})[food] = rating
+
+    # Write every rating in the store to the database, with replace=False
+    # only the ratings that are not in the database yet are written
+    def save(self, store, replace=True):
+        updated = now()
+        rows = ((self.dataset, self.user, food_type, food, rating, updated)
+                for food_type, food_ratings in store.items()
+                for food, rating in food_ratings.items())
+        self._write(rows, upsert_sql if replace else insert_missing_sql)
+
+    # Start writing every change made to the ratings store through to the
+    # database. Changes are written when flush is called or once
+    # batch_rows changes are waiting
+    def attach(self, store):
+        store.listeners.append(self.record)
+
+    # Store listener, only the latest rating for each food is kept
+    def record(self, food_type, food, old_rating, new_rating):
+        self._pending[(food_type, food)] = new_rating
+        if len(self._pending) >= self.batch_rows:
+            self.flush()
+
+    # Write the waiting changes in a single transaction
+    def flush(self):
+        if not self._pending:
+            return
+        updated = now()
+        pending, self._pending = self._pending, {}
+        self._write((self.dataset, self.user, food_type, food, rating,
+                     updated)
+                    for (food_type, food), rating in pending.items())
+
+    def _write(self, rows, sql=upsert_sql):
+        with self._connection:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= self.batch_rows:
+                    self._connection.executemany(sql, batch)
+                    batch = []
+            if batch:
+                self._connection.executemany(sql, batch)
+
+    # Count the ratings of every user of the dataset by rating, or by food
+    # type and rating, without loading any ratings into memory
+    def rating_counts(self, by_food_type=False):
+        if by_food_type:
+            return self._connection.execute(
+                "SELECT food_type, rating, COUNT(*) FROM ratings "
+                "WHERE dataset = ? GROUP BY food_type, rating "
+                "ORDER BY food_type, rating", (self.dataset,)).fetchall()
+        return self._connection.execute(
+            "SELECT rating, COUNT(*) FROM ratings WHERE dataset = ? "
+            "GROUP BY rating ORDER BY rating", (self.dataset,)).fetchall()
+
+    # Number of users with ratings of the dataset in the database
+    def user_count(self):
+        return self._connection.execute(
+            "SELECT COUNT(DISTINCT user) FROM ratings WHERE dataset = ?",
+            (self.dataset,)).fetchone()[0]
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat()
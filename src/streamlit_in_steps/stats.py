@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+from streamlit_in_steps.export import write_atomic
+from streamlit_in_steps.store import max_rating_codes
+
+# Stats - Counts of each rating in each food type for a ratings store
+#
+# The counts are computed in full (with numpy.bincount over the stored
+# rating codes) when a CSV is loaded and then kept up to date by a store
+# listener, so showing them never needs a scan of every food.
+
+
+class RatingStats:
+    def __init__(self):
+        self.store = None
+        self.counts = {}
+        # Number of rating changes recorded, lets a panel tell whether the
+        # ratings changed since it was drawn
+        self.changes = 0
+
+    # Count every rating in the store and keep the counts up to date with
+    # every further change
+    def attach(self, store):
+        self.store = store
+        self.recompute()
+        store.listeners.append(self.record)
+
+    def recompute(self):
+        self.counts = {
+            food_type: np.bincount(food_ratings.codes(),
+                                   minlength=max_rating_codes)
+            for food_type, food_ratings in self.store.items()
+        }
+
+    # Store listener, moves one count from the old rating to the new one
+    def record(self, food_type, food, old_rating, new_rating):
+        counts = self.counts.get(food_type)
+        if counts is None:
+            counts = np.zeros(max_rating_codes, dtype=np.int64)
+            self.counts[food_type] = counts
+        if old_rating is not None:
+            counts[self.store.code(old_rating)] -= 1
+        counts[self.store.code(new_rating)] += 1
+        self.changes += 1
+
+    # Counts as a DataFrame with a row per food type, a column per rating
+    # and a total column
+    def summary(self):
+        labels = self.store.labels
+        summary = pd.DataFrame(
+            [counts[:len(labels)] for counts in self.counts.values()],
+            index=pd.Index(list(self.counts), name="food_type"),
+            columns=labels,
+            dtype=np.int64,
+        )
+        summary["total"] = summary.sum(axis=1)
+        return summary
+
+    # Return up to limit (food_type, food) pairs with the given rating,
+    # only run when the foods are shown
+    def foods_rated(self, rating, limit=10):
+        code = self.store.code(rating)
+        foods = []
+        for food_type, food_ratings in self.store.items():
+            counts = self.counts.get(food_type)
+            if counts is None or counts[code] == 0:
+                continue
+            names = food_ratings.names()
+            for position in np.flatnonzero(food_ratings.codes() == code):
+                foods.append((food_type, names[position]))
+                if len(foods) >= limit:
+                    return foods
+        return foods
+
+    # Write the counts to a summary CSV file
+    def write_summary(self, file_path):
+        summary = self.summary()
+        write_atomic(file_path, lambda summary_file: summary_file.write(
+            summary.to_csv().encode("utf-8")))
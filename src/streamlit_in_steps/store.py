@@ -0,0 +1,335 @@
+import sys
+from array import array
+from collections.abc import MutableMapping
+
+import numpy as np
+import pandas as pd
+
+# Store - A compact in memory store for the food ratings held in session
+# state, used in place of a nested dictionary of strings
+#
+# The store behaves like the nested dictionary it replaces
+# (store[food_type][food] = rating) but each food type keeps:
+# - an index of food names to positions for O(1) lookups, built once when
+#   a CSV is loaded and shared by every copy of the store
+# - an array of ratings stored as 1 byte codes into the ratings list
+#
+# Copying a store (one copy per session of the shared, cached store) is
+# copy on write. A copy shares the rating codes of the store it was copied
+# from and keeps only an overlay of the ratings it changes, so a session
+# costs memory in proportion to its changes rather than to the number of
+# foods. Once the overlay holds more than 1/overlay_max_fraction of the
+# foods the codes are copied and the overlay is folded into them, which
+# bounds a session at about 1 byte per food. Foods added by a session are
+# kept alongside the shared index.
+#
+# Ratings that are not in the ratings list (e.g. "Review") are given the
+# next free code so loaded data is never lost.
+#
+# Functions in store.listeners are called with
+# (food_type, food, old_rating, new_rating) whenever a rating changes or a
+# food is added (old_rating is None), listeners are not copied.
+# Both CSV formats written by format_data can be built directly from the
+# arrays without creating a Python string per rating.
+
+# Ratings are stored as signed bytes, -1 is reserved for "no rating"
+max_rating_codes = 127
+
+# A copy keeps its changes in an overlay until they exceed this fraction of
+# its foods, an overlay entry costs around 64 times the 1 byte of a code
+overlay_max_fraction = 64
+
+
+# The food names for a food type and their positions, never modified once
+# built so it can be shared between copies of the store
+class FoodIndex:
+    def __init__(self, names):
+        self.names = list(names)
+        self.positions = {name: position
+                          for position, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    # Approximate bytes held by the names, their list and the positions
+    def nbytes(self):
+        return (sys.getsizeof(self.names) + sys.getsizeof(self.positions)
+                + sum(map(sys.getsizeof, self.names)))
+
+
+class FoodRatings(MutableMapping):
+    def __init__(self, store, food_type, index=None, codes=None):
+        self._store = store
+        self._food_type = food_type
+        self._index = index if index is not None else FoodIndex([])
+        # Codes of the indexed foods, by position
+        self._codes = codes if codes is not None else array("b")
+        # Changed codes of indexed foods by position while _codes is shared
+        # with another copy, None once _codes is owned by this copy
+        self._overlay = None
+        # Foods added after the index was built
+        self._added_names = []
+        self._added_positions = {}
+        self._added_codes = array("b")
+
+    def _position(self, food):
+        position = self._index.positions.get(food)
+        if position is None:
+            position = self._added_positions.get(food)
+        return position
+
+    def _get_code(self, position):
+        indexed = len(self._index)
+        if position >= indexed:
+            return self._added_codes[position - indexed]
+        if self._overlay:
+            code = self._overlay.get(position)
+            if code is not None:
+                return code
+        return self._codes[position]
+
+    def _set_code(self, position, code):
+        indexed = len(self._index)
+        if position >= indexed:
+            self._added_codes[position - indexed] = code
+        elif self._overlay is None:
+            self._codes[position] = code
+        else:
+            self._overlay[position] = code
+            if len(self._overlay) > indexed // overlay_max_fraction:
+                self._own_codes()
+
+    # Copy the shared codes and fold the overlay into them
+    def _own_codes(self):
+        codes = array("b", self._codes)
+        for position, code in self._overlay.items():
+            codes[position] = code
+        self._codes = codes
+        self._overlay = None
+
+    def __getitem__(self, food):
+        position = self._position(food)
+        if position is None:
+            raise KeyError(food)
+        return self._store.labels[self._get_code(position)]
+
+    def __setitem__(self, food, rating):
+        code = self._store.code(rating)
+        position = self._position(food)
+        if position is None:
+            self._added_positions[food] = len(self)
+            self._added_names.append(food)
+            self._added_codes.append(code)
+            self._store.notify(self._food_type, food, None, rating)
+        else:
+            old_code = self._get_code(position)
+            if old_code != code:
+                self._set_code(position, code)
+                self._store.notify(self._food_type, food,
+                                   self._store.labels[old_code], rating)
+
+    # Removing a food rebuilds the index so the remaining foods keep their
+    # order, foods are rarely removed so this is O(n)
+    def __delitem__(self, food):
+        position = self._position(food)
+        if position is None:
+            raise KeyError(food)
+        names = self.names()
+        codes = array("b", self.codes().tobytes())
+        del names[position]
+        del codes[position]
+        self._index = FoodIndex(names)
+        self._codes = codes
+        self._overlay = None
+        self._added_names = []
+        self._added_positions = {}
+        self._added_codes = array("b")
+
+    def __iter__(self):
+        yield from self._index.names
+        yield from self._added_names
+
+    def __len__(self):
+        return len(self._index) + len(self._added_codes)
+
+    def __contains__(self, food):
+        return self._position(food) is not None
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    # Return the rating code for a food, for ratings in the ratings list
+    # this is the position in that list
+    def code(self, food):
+        return self._get_code(self._position(food))
+
+    # Return the food names in order
+    def names(self):
+        return self._index.names + self._added_names
+
+    # Return the rating codes as a numpy int8 array in food order, with the
+    # overlay applied
+    def codes(self):
+        indexed = len(self._index)
+        codes = np.empty(len(self), dtype=np.int8)
+        codes[:indexed] = self._codes
+        if self._overlay:
+            codes[np.fromiter(self._overlay.keys(), dtype=np.int64)] = \
+                np.fromiter(self._overlay.values(), dtype=np.int8)
+        codes[indexed:] = self._added_codes
+        return codes
+
+    # Approximate bytes held by this food type, including its food index
+    # and the codes it shares with its copies
+    def nbytes(self):
+        return (self._index.nbytes() + sys.getsizeof(self._codes)
+                + sys.getsizeof(self._overlay)
+                + sys.getsizeof(self._added_names)
+                + sys.getsizeof(self._added_positions)
+                + sum(map(sys.getsizeof, self._added_names))
+                + sys.getsizeof(self._added_codes))
+
+    # Return a copy that shares the food index and rating codes, both this
+    # food type and the copy write their changes to an overlay from now on
+    def copy(self, store):
+        if self._overlay is None:
+            self._overlay = {}
+        food_ratings = FoodRatings(store, self._food_type, self._index,
+                                   self._codes)
+        food_ratings._overlay = dict(self._overlay)
+        food_ratings._added_names = list(self._added_names)
+        food_ratings._added_positions = dict(self._added_positions)
+        food_ratings._added_codes = array("b", self._added_codes)
+        return food_ratings
+
+
+class RatingStore(MutableMapping):
+    def __init__(self, ratings):
+        self.labels = list(ratings)
+        self._label_codes = {label: code
+                             for code, label in enumerate(self.labels)}
+        self._food_types = {}
+        self.listeners = []
+
+    # Build a store from a nested dictionary of food type and food/rating
+    @classmethod
+    def from_dict(cls, foods, ratings):
+        store = cls(ratings)
+        for food_type, food_ratings in foods.items():
+            store[food_type] = food_ratings
+        return store
+
+    # Return the code for a rating, adding it to the labels if it is new
+    def code(self, rating):
+        code = self._label_codes.get(rating)
+        if code is None:
+            if len(self.labels) >= max_rating_codes:
+                raise ValueError(f"Too many distinct ratings to store "
+                                 f"{rating!r}")
+            code = len(self.labels)
+            self.labels.append(rating)
+            self._label_codes[rating] = code
+        return code
+
+    def notify(self, food_type, food, old_rating, new_rating):
+        for listener in self.listeners:
+            listener(food_type, food, old_rating, new_rating)
+
+    def __getitem__(self, food_type):
+        return self._food_types[food_type]
+
+    # Setting a food type replaces all of its foods
+    def __setitem__(self, food_type, food_ratings):
+        codes = array("b", [self.code(rating)
+                            for rating in food_ratings.values()])
+        self._food_types[food_type] = FoodRatings(
+            self, food_type, FoodIndex(food_ratings.keys()), codes)
+
+    def __delitem__(self, food_type):
+        del self._food_types[food_type]
+
+    # Return the stored FoodRatings of a food type, adding the food type
+    # from default first if it is new. MutableMapping.setdefault would
+    # return default itself rather than the FoodRatings built from it
+    def setdefault(self, food_type, default=None):
+        if food_type not in self._food_types:
+            self[food_type] = default if default is not None else {}
+        return self._food_types[food_type]
+
+    def __iter__(self):
+        return iter(self._food_types)
+
+    def __len__(self):
+        return len(self._food_types)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    # Return a copy of the store for a session, the food indexes and rating
+    # codes are shared and each copy keeps an overlay of its changes
+    def copy(self):
+        store = RatingStore(self.labels)
+        for food_type, food_ratings in self._food_types.items():
+            store._food_types[food_type] = food_ratings.copy(store)
+        return store
+
+    # Approximate bytes held by the store, e.g. to size a cache entry
+    def nbytes(self):
+        return sum(food_ratings.nbytes()
+                   for food_ratings in self._food_types.values())
+
+    # Return the ratings as a nested dictionary of food type and food/rating
+    def to_dict(self):
+        return {food_type: dict(food_ratings.items())
+                for food_type, food_ratings in self._food_types.items()}
+
+    def _categorical(self, codes):
+        return pd.Categorical.from_codes(codes, categories=self.labels)
+
+    # Long format, one row per food with columns food_type, food, rating.
+    # The food type and rating columns are categoricals built from the
+    # stored codes
+    def to_long_frame(self):
+        food_types = list(self._food_types)
+        lengths = [len(self._food_types[food_type])
+                   for food_type in food_types]
+
+        food_column = np.empty(sum(lengths), dtype=object)
+        start = 0
+        for food_type, length in zip(food_types, lengths):
+            food_column[start:start + length] = \
+                self._food_types[food_type].names()
+            start += length
+
+        codes = [self._food_types[food_type].codes()
+                 for food_type in food_types]
+        rating_codes = (np.concatenate(codes) if codes
+                        else np.array([], dtype=np.int8))
+
+        type_codes = np.repeat(np.arange(len(food_types)), lengths)
+
+        return pd.DataFrame({
+            "food_type": pd.Categorical.from_codes(type_codes,
+                                                   categories=food_types),
+            "food": food_column,
+            "rating": self._categorical(rating_codes),
+        })
+
+    # Wide format, a <food_type>, <food_type>_rating pair of columns per
+    # food type. Shorter food types are padded with empty food cells and
+    # missing ratings, both are written to CSV as empty cells
+    def to_wide_frame(self):
+        max_length = max((len(food_ratings) for food_ratings
+                          in self._food_types.values()), default=0)
+
+        columns = {}
+        for food_type, food_ratings in self._food_types.items():
+            food_column = np.full(max_length, "", dtype=object)
+            food_column[:len(food_ratings)] = food_ratings.names()
+            columns[food_type] = food_column
+
+            rating_codes = np.full(max_length, -1, dtype=np.int8)
+            rating_codes[:len(food_ratings)] = food_ratings.codes()
+            columns[f"{food_type}_rating"] = self._categorical(rating_codes)
+
+        return pd.DataFrame(columns, copy=False)
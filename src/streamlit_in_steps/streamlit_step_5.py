@@ -1,6 +1,29 @@
 import streamlit as st
 import pandas as pd
+import functools
 import os
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from streamlit_in_steps.background import ParseJob
+from streamlit_in_steps.cache import LRUCache, content_hash
+from streamlit_in_steps.columnar import binary_extensions, write_binary
+from streamlit_in_steps.export import write_csv
+from streamlit_in_steps.journal import RatingJournal, remove_old_journals
+from streamlit_in_steps.merge import (merge_policies, parse_files,
+                                      source_hash, source_size)
+from streamlit_in_steps.pagination import filter_foods, page_count, page_slice
+from streamlit_in_steps.profiling import PhaseProfiler
+from streamlit_in_steps.search import FoodSearch, SearchIndex, search_limit
+from streamlit_in_steps.sqlite_store import SQLiteRatings, dataset_totals
+from streamlit_in_steps.stats import RatingStats
+from streamlit_in_steps.store import RatingStore
+from streamlit_in_steps.validation import ValidationReport, allowed_ratings
+from streamlit_in_steps.widget_keys import (WidgetKeys, clear_widget_state,
+                                            name_id, session_state_size)
 
 # Flow - Step 5 - Read data from a dictionary and display it as a set
 # of radio buttons, adjusting the radio buttons to the user's rating
@@ -15,8 +38,66 @@ import os
 # Users can save changes as a CSV file in either a long or horizontal format
 #
 # Step 5 specifically adds support for:
-# - Loading data from a CSV file, CSV support is limited to horizontal format
+# - Loading data from a CSV file in either horizontal or long format, the
+#   format is detected from the CSV header
 # - Resetting session state when CSV file is changed
+# - Building the foods dictionary with column operations (see ingest.py)
+#   so that large CSV files load quickly
+# - Food types are discovered from the CSV header, any <food_type> column
+#   (with an optional <food_type>_rating column) becomes a food type
+# - Long format CSV files are read in chunks so large files load in
+#   bounded memory
+# - Parsed CSV files are cached by a hash of their content so reruns and
+#   re-uploads of the same file do not parse the file again
+# - Large food types are shown a page at a time with a search box, only
+#   the foods on the visible page are rendered as radio buttons
+# - A table mode that edits a whole food type in a single data editor,
+#   including setting the rating of all selected foods at once
+# - Ratings are held in a compact store (see store.py) that shares the
+#   loaded food names between sessions and keeps ratings as 1 byte codes
+# - CSV files are written by streaming rows from the ratings store in
+#   chunks with a progress bar, optionally gzip compressed
+# - Each save writes a new timestamped file atomically, keeping only the
+#   newest files of each session, so users can save as often as they like
+# - Every rating change and added food is autosaved to a journal, a session
+#   is rebuilt from the journal when the same file is loaded again with
+#   the same session id in the URL (e.g. after a reconnect or restart).
+#   Journals not written for a week are deleted
+# - The panels are fragments, a widget change reruns only its own panel
+#   and each panel shows how long it took to run. A rating change in the
+#   food list reruns the whole app when the search results or the summary
+#   are shown, so they do not show the old ratings
+# - The Original CSV Dataframe and Dictionary views are only built when
+#   switched on and show at most preview_rows rows
+# - Optionally keeping every user's ratings in a SQLite database, set the
+#   FOOD_RATINGS_DB environment variable to the database path to enable it
+# - A ratings summary with the count of each rating per food type, kept up
+#   to date as ratings change, that can be saved as a summary CSV
+# - An opt in profiling mode, add ?profile=1 to the URL or set the
+#   FOOD_RATINGS_PROFILE environment variable, that times each phase of
+#   every rerun and shows the timings in the sidebar (and the memory
+#   allocated, only with the environment variable). Set
+#   FOOD_RATINGS_PROFILE_DUMPS to N to also keep cProfile stats of the
+#   last N reruns
+# - Uploaded CSV files are parsed on a worker thread while a progress bar
+#   shows the rows read and food types found, uploading a different file
+#   cancels the load
+# - Several CSV files can be uploaded at once, they are parsed in parallel
+#   and merged into one set of ratings (see merge.py) with a choice of how
+#   a food rated by more than one file is resolved
+# - Parquet and Arrow (Feather) files can be loaded and saved as well as
+#   CSV files, in either format, with the ratings dictionary encoded
+# - Searching for a food by name across every food type, backed by an index
+#   built once per loaded file (see search.py) that added foods join
+# - Loaded rows are validated before the ratings are built (see
+#   validation.py), names and ratings are normalised, unknown ratings
+#   become "review" and a report of the problems found is shown
+# - Picking a file from a directory on the server instead of uploading it,
+#   the file is memory mapped rather than read through the upload path.
+#   Set FOOD_RATINGS_DATA_DIR to the directory, data by default
+# - The widgets of each food are keyed by the file, food type and food (see
+#   widget_keys.py) and the state of the food widgets no longer shown is
+#   dropped, the food list shows the size of the session state
 #
 # Outcome:
 # - A selection box automatically populated with the food types
@@ -28,15 +109,16 @@ import os
 # - Updating a user rating persists between changes of food type
 # - Adding a new food item to the list persists between changes of food type
 # - Users can save their data to a CSV file
-# - Users can load their data from a CSV file that is in horizontal format
+# - Users can load their data from a CSV file in horizontal or long format
 #
 # Known Issues:
-# - Long format CSVs are not supported for loading
 # - Note: Using a text_input and button means the text area has
 #   "Hit enter to apply" which is meaningless for the use case. This is a
 #   known limitation in Streamlit regardless of if forms or text_input and a
 #   button is used.
 
+app_start = time.perf_counter()
+
 if "foods" not in st.session_state:
     st.session_state.foods = {
     }
@@ -47,210 +129,486 @@ if "build_food_dict" not in st.session_state:
 if 'csv_file_name' not in st.session_state:
     st.session_state.csv_file_name = None
 
-ratings = ["love", "like", "indifferent", "dislike", "review"]
+if 'csv_file_hash' not in st.session_state:
+    st.session_state.csv_file_hash = None
+
+if 'food_page' not in st.session_state:
+    st.session_state.food_page = 1
+
+if 'rating_table_version' not in st.session_state:
+    st.session_state.rating_table_version = 0
+
+if 'journal' not in st.session_state:
+    st.session_state.journal = None
+
+if 'run_times' not in st.session_state:
+    st.session_state.run_times = {}
+
+if 'ratings_db' not in st.session_state:
+    st.session_state.ratings_db = None
+
+if 'rating_stats' not in st.session_state:
+    st.session_state.rating_stats = None
+
+if 'panel_rating_changes' not in st.session_state:
+    st.session_state.panel_rating_changes = 0
+
+if 'parse_job' not in st.session_state:
+    st.session_state.parse_job = None
+
+if 'food_finder' not in st.session_state:
+    st.session_state.food_finder = None
+
+if 'loaded_file' not in st.session_state:
+    st.session_state.loaded_file = None
 
+if 'upload_hashes' not in st.session_state:
+    st.session_state.upload_hashes = {}
+
+# Profiling is only switched on by the environment or the URL
+profiling_enabled = (bool(os.environ.get("FOOD_RATINGS_PROFILE"))
+                     or st.query_params.get("profile") == "1")
+
+# cProfile dumps are written on the server and memory tracing slows every
+# session, so only the environment can switch them on
+profile_dump_reruns = int(os.environ.get("FOOD_RATINGS_PROFILE_DUMPS", "0"))
+profile_memory = bool(os.environ.get("FOOD_RATINGS_PROFILE"))
+
+if ('profiler' not in st.session_state
+        or st.session_state.profiler.enabled != profiling_enabled):
+    st.session_state.profiler = PhaseProfiler(
+        enabled=profiling_enabled, dump_reruns=profile_dump_reruns,
+        trace_memory=profile_memory)
+
+st.session_state.profiler.start_rerun()
+
+# Loaded files are validated against the same ratings, so every loaded
+# rating has a radio button
+ratings = allowed_ratings
+
+# Saved files are named <prefix>_<session id>_<timestamp>_<id>.<extension>
+# and the newest files of each session are kept
 output_file_prefix = "output/food_ratings"
 
-st.set_page_config(page_title="Streamlit Step 5", layout="wide")
+# File types that can be saved, by label
+save_file_types = {"CSV": "csv", "Parquet": "parquet", "Feather": "feather"}
 
-st.write("# Streamlit Step 5")
-st.write("Allows the user to **load data in horizontal format**") # noqa E501
+# File types that can be uploaded
+upload_file_types = ["csv"] + [extension.lstrip(".")
+                               for extension in binary_extensions]
 
-st.warning("CSV file must be **Horizontal** format to load data")
+# Directory of the files that can be loaded straight from the server, set
+# FOOD_RATINGS_DATA_DIR to an empty string to only allow uploads
+dataset_directory = os.environ.get("FOOD_RATINGS_DATA_DIR", "data")
 
+summary_file_path = f"{output_file_prefix}_summary.csv"
 
-def reset_session_state():
-    st.session_state.foods = {}
-    st.session_state.build_food_dict = True
-    st.session_state.csv_file_name = None
+# Path of the optional SQLite database that keeps the ratings of every user
+ratings_db_path = os.environ.get("FOOD_RATINGS_DB")
 
+# Seconds the rating counts across all users are reused for
+dataset_totals_ttl = 30
 
-# This function assumes the loaded file is in the horizontal format
-# and the columns are named "fruit", "fruit_rating", "vegetable",
-# "vegetable_rating", "meat", "meat_rating"
-# It caters for the scenario where only the food columns are present
-def build_foods_dict(df):
-    # Initialise a foods dictionary which
-    # is a nested dictionary by food type and then food/rating
-    foods_dict = {
-        "fruit": {},
-        "vegetable": {},
-        "meat": {},
-    }
+# Maximum number of rows (or foods per food type) shown in the debug views
+preview_rows = 1000
 
-    # Check if the adoption columns already exist and create them if not
-    if "fruit_rating" not in df.columns:
-        df["fruit_rating"] = "review"
-    if "vegetable_rating" not in df.columns:
-        df["vegetable_rating"] = "review"
-    if "meat_rating" not in df.columns:
-        df["meat_rating"] = "review"
-
-    # Iterate over each row in the dataframe
-    for index, row in df.iterrows():
-        fruit = row.get("fruit")
-        vegetable = row.get("vegetable")
-        meat = row.get("meat")
-
-        # Get the rating for each food
-        fruit_rating = row.get("fruit_rating")
-        vegetable_rating = row.get("vegetable_rating")
-        meat_rating = row.get("meat_rating")
-
-        # If a food exists in the column but the rating does not
-        # default the rating to "Review"
-        if pd.notna(fruit) and pd.isna(fruit_rating):
-            fruit_rating = "Review"
-        if pd.notna(vegetable) and pd.isna(vegetable_rating):
-            vegetable_rating = "Review"
-        if pd.notna(meat) and pd.isna(meat_rating):
-            meat_rating = "Review"
-
-        # Add the food and rating to the dictionary
-        if pd.notna(fruit):
-            foods_dict["fruit"][fruit] = fruit_rating
-        if pd.notna(vegetable):
-            foods_dict["vegetable"][vegetable] = vegetable_rating
-        if pd.notna(meat):
-            foods_dict["meat"][meat] = meat_rating
-
-    # Indicate the dictionary does not need building
-    st.session_state.build_food_dict = False
-
-    return foods_dict
-
-
-def write_csv(file_path, dataframe):
-    success = False
-    error = ""
-    try:
-        if os.path.exists(file_path):
-            raise FileExistsError
-        # Use dataframe.csv to save the data
-        dataframe.to_csv(file_path, index=False)
-        success = True
-    except FileNotFoundError:
-        error = f"File {file_path} not found"
-    except FileExistsError:
-        error = f"File {file_path} already exists"
-    except Exception as e:
-        error = f"An error occurred: {e}"
-    return success, error
-
-
-def format_data(type, data):
-    formatted_data = []
-
-    # Long type format is a list of lists
-    # food_type, food, rating
-    # e.g.
-    # fruit, apple, like
-    # vegetable, carrot, dislike
-    if type == "long":
-        data_tuples = []
-        for food_type, food_ratings in data.items():
-            for food, rating in food_ratings.items():
-                data_tuples.append((food_type, food, rating))
-
-        # Create DataFrame
-        formatted_data = pd.DataFrame(data_tuples,
-                                      columns=['food_type',
-                                               'food',
-                                               'rating'])
-
-    elif type == "wide":
-        # Wide type format is a shorter condensed format
-        # <food_type>, <food_type>_rating, <food_type>, <food_type>_rating etc
-        # e.g.
-        # fruit, fruit_rating, vegetable, vegetable_rating, meat, meat_rating
-        # orange, like, cabbage, dislike, beef, indifferent
-        #
-        # When categories have unequal lists of items empty cells are written
-        # e.g.
-        # apple, love,,, chicken, like
-        # Determine the maximum length of the lists in all categories
-        max_length = max(
-            len(data["fruit"]),
-            len(data["vegetable"]),
-            len(data["meat"])
-        )
-
-        formatted_data = pd.DataFrame(
-            {
-                "fruit": list(data["fruit"].keys()) +
-                [""] * (max_length - len(data["fruit"])),
-                "fruit_rating": list(data["fruit"].values()) +# noqa E501
-                [""] * (max_length - len(data["fruit"])),
-                "vegetable": list(data["vegetable"].keys()) +
-                [""] * (max_length - len(data["vegetable"])),
-                "vegetable_rating": list(data["vegetable"].values()) +
-                [""] * (max_length - len(data["vegetable"])),
-                "meat": list(data["meat"].keys()) +# noqa E501
-                [""] * (max_length - len(data["meat"])),
-                "meat_rating": list(data["meat"].values()) +# noqa E501
-                [""] * (max_length - len(data["meat"])),
-            }
-        )
-
-    return formatted_data
-
-
-# Add a sidebar that allows the user to upload a CSV file
-uploaded_file = st.sidebar.file_uploader("Choose a CSV file", type="csv")
-
-if uploaded_file is not None:
-    # Ensure all persistent data is reset when a new file is uploaded
-    if st.session_state.csv_file_name != uploaded_file.name:
-        reset_session_state()
-        st.session_state.csv_file_name = uploaded_file.name
+# Autosave journals are written to this directory
+journal_directory = "output/journal"
 
-    # Read the CSV into a DataFrame
-    df = pd.read_csv(uploaded_file)
+# Number of foods shown on each page of the food list
+page_sizes = [25, 50, 100, 250]
 
-    with st.expander("**Original CSV Dataframe**"):
-        st.dataframe(data=df, use_container_width=True)
+# Limits for the cache of parsed CSV files shared by all sessions
+parse_cache_max_entries = 8
+parse_cache_max_bytes = 512 * 1024 * 1024
 
-    # Build a dictionary from the data in the uploaded CSV
-    # Only do this the first time a CSV is loaded
-    if st.session_state.build_food_dict:
-        st.session_state.foods = build_foods_dict(df)
+# Number of uploads parsed at once across all sessions
+parse_workers = 2
 
-    # Create a reference to the session state dictionary
-    foods = st.session_state.foods
+# Number of threads used to parse the files of a multiple file upload,
+# with a single CPU the files are parsed one after another instead
+parse_file_workers = min(4, os.cpu_count() or 1)
 
-    with st.expander("**Dictionary**"):
-        st.write(foods)
+# Seconds between updates of the progress bar while a CSV file is parsed
+parse_poll_interval = 0.2
+
+st.set_page_config(page_title="Streamlit Step 5", layout="wide")
+
+st.write("# Streamlit Step 5")
+st.write("Allows the user to **load data in horizontal or long format**") # noqa E501
+
+st.info("CSV file can be in **Horizontal** or **Long** format")
+
+
+def reset_session_state():
+    if st.session_state.parse_job is not None:
+        st.session_state.parse_job.cancel()
+    st.session_state.parse_job = None
+    st.session_state.foods = {}
+    st.session_state.build_food_dict = True
+    st.session_state.csv_file_name = None
+    st.session_state.csv_file_hash = None
+    st.session_state.food_page = 1
+    st.session_state.journal = None
+    if st.session_state.ratings_db is not None:
+        st.session_state.ratings_db.close()
+    st.session_state.ratings_db = None
+    st.session_state.rating_stats = None
+    st.session_state.food_finder = None
+    st.session_state.loaded_file = None
+    clear_widget_state(st.session_state)
+
+
+# Return the id of this session, kept in the URL so that a reconnect or
+# server restart finds the same autosave journal
+def get_session_id():
+    session_id = st.query_params.get("session", "")
+    if not re.fullmatch(r"[0-9a-f]{32}", session_id):
+        session_id = uuid.uuid4().hex
+        st.query_params["session"] = session_id
+    return session_id
+
+
+# Go back to the first page when the list of foods being paged changes
+def reset_food_page():
+    st.session_state.food_page = 1
+
+
+# The table widget key includes the food type, search and a version so
+# that its stored edits are discarded whenever the rows it shows change
+def rating_table_key(widget_keys, food_type, search):
+    version = st.session_state.rating_table_version
+    return widget_keys.key(food_type, f"table_{name_id(search)}_{version}")
+
+
+# Show the foods as a single editable table with a rating column limited
+# to the ratings list and apply any edits to the foods dictionary.
+# Only the ratings that changed are written back to the dictionary
+def edit_rating_table(foods, food_type, food_names, key):
+    table = pd.DataFrame({
+        "selected": False,
+        "food": food_names,
+        "rating": [foods[food_type][food] for food in food_names],
+    })
+
+    edited = st.data_editor(
+        table,
+        key=key,
+        hide_index=True,
+        use_container_width=True,
+        disabled=["food"],
+        column_config={
+            "selected": st.column_config.CheckboxColumn("Select"),
+            "food": st.column_config.TextColumn("Food"),
+            "rating": st.column_config.SelectboxColumn("Rating",
+                                                       options=ratings,
+                                                       required=True),
+        },
+    )
+
+    changed = edited["rating"] != table["rating"]
+    for food, rating in zip(edited["food"][changed],
+                            edited["rating"][changed]):
+        foods[food_type][food] = rating
+
+
+# Callback for the bulk rating button, sets every food selected in the
+# table to the chosen rating and starts a fresh table so the selections
+# are cleared and the new ratings are shown
+def apply_bulk_rating(foods, food_type, food_names, key):
+    edited_rows = st.session_state[key]["edited_rows"]
+    for row, changes in edited_rows.items():
+        if changes.get("selected"):
+            foods[food_type][food_names[int(row)]] = \
+                st.session_state.bulk_rating
+    st.session_state.rating_table_version += 1
+
+
+# A single parse cache is shared by every session on the server
+@st.cache_resource
+def get_parse_cache():
+    return LRUCache(max_entries=parse_cache_max_entries,
+                    max_bytes=parse_cache_max_bytes)
+
+
+# A single pool of parse worker threads is shared by every session
+@st.cache_resource
+def get_parse_executor():
+    return ThreadPoolExecutor(max_workers=parse_workers,
+                              thread_name_prefix="csv_parse")
+
+
+# A single pool of threads parses the files of multiple file uploads for
+# every session. Threads are used rather than processes, forking the
+# server's threads can deadlock the child and a spawned (or forkserver)
+# worker runs this script again as it is the __main__ module while
+# Streamlit runs it
+@st.cache_resource
+def get_file_executor():
+    if parse_file_workers < 2:
+        return None
+    return ThreadPoolExecutor(max_workers=parse_file_workers,
+                              thread_name_prefix="file_parse")
+
+
+# Run on a parse worker thread, parse, validate and merge the CSV files and
+# build the ratings store. The file executor is passed in as cached
+# resources can only be used from the script thread
+def parse_csv(files, progress, merge_policy, file_executor):
+    report = ValidationReport()
+    df, foods, csv_format = parse_files(files, progress, file_executor,
+                                        merge_policy, report)
+    return df, RatingStore.from_dict(foods, ratings), csv_format, report
+
+
+# A single file is keyed by the hash of its source, several files by the
+# hashes of their sources in upload order and the merge policy. Hashes of
+# the sources already known (e.g. of uploads) can be passed in
+def files_hash(files, merge_policy, hashes=None):
+    if hashes is None:
+        hashes = [source_hash(source) for name, source in files]
+    if len(files) == 1:
+        return hashes[0]
+    return content_hash("\n".join(hashes + [merge_policy]).encode())
+
+
+# The rating counts of every user of a file, counting them scans the
+# file's ratings so they are shared by every session and only counted
+# again once they are dataset_totals_ttl seconds old
+@st.cache_data(ttl=dataset_totals_ttl, max_entries=parse_cache_max_entries)
+def get_dataset_totals(path, dataset):
+    return dataset_totals(path, dataset)
+
+
+# Return the names of the files in the directory that can be loaded, in
+# name order
+def list_datasets(directory):
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return []
+    return sorted(entry.name for entry in entries
+                  if entry.is_file() and entry.name.lower().endswith(
+                      tuple(f".{file_type}"
+                            for file_type in upload_file_types)))
+
+
+# The search index of the foods in a loaded file, built once per file and
+# shared by every session that loads it
+@st.cache_resource(max_entries=parse_cache_max_entries)
+def get_search_index(file_hash, _foods):
+    return SearchIndex(_foods)
+
+
+# Parse the uploaded CSV files and build the ratings store, keyed by a hash
+# of the files so the work is only done once per distinct upload.
+# The file is parsed on a worker thread while the script shows its
+# progress, the progress updates let Streamlit stop this run as soon as a
+# different file is uploaded and the new run then cancels the old parse.
+# The cached store must not be edited, use a copy of it in session state
+def load_csv(files, file_hash, merge_policy):
+    parse_cache = get_parse_cache()
+    cached = parse_cache.get(file_hash)
+    if cached is not None:
+        return cached
+
+    job = st.session_state.parse_job
+    if job is None or job.file_hash != file_hash or job.cancelled():
+        if job is not None:
+            job.cancel()
+        job = ParseJob(get_parse_executor(),
+                       functools.partial(parse_csv, merge_policy=merge_policy,
+                                         file_executor=get_file_executor()),
+                       files, file_hash,
+                       sum(source_size(source) for name, source in files))
+        st.session_state.parse_job = job
+
+    progress_ph = st.empty()
+    while not job.wait(parse_poll_interval):
+        progress_ph.progress(job.fraction,
+                             text=f"Loading CSV: {job.rows} rows, "
+                             f"{job.food_types} food types")
+    progress_ph.empty()
+
+    st.session_state.parse_job = None
+    cached = job.result()
+    df, loaded_foods = cached[:2]
+    # The cache holds the DataFrame and the ratings store, not the files
+    size = int(df.memory_usage(deep=True).sum()) + loaded_foods.nbytes()
+    parse_cache.put(file_hash, cached, size)
+    return cached
+
+
+# Show at most preview_rows rows of a DataFrame, either the first rows or
+# a random sample
+def preview_dataframe(df):
+    if len(df) > preview_rows:
+        sample = st.radio("Preview", ["First rows", "Random sample"],
+                          horizontal=True, key="csv_preview_kind")
+        st.caption(f"Showing {preview_rows} of {len(df)} rows")
+        if sample == "Random sample":
+            df = df.sample(preview_rows, random_state=0).sort_index()
+        else:
+            df = df.head(preview_rows)
+    st.dataframe(data=df, use_container_width=True)
+
+
+# Show the number of foods in each food type and at most preview_rows
+# foods/ratings from each food type
+def preview_foods(foods):
+    st.caption("Foods per food type: " + ", ".join(
+        f"{food_type} {len(food_ratings)}"
+        for food_type, food_ratings in foods.items()))
+    st.write({food_type: dict(islice(food_ratings.items(), preview_rows))
+              for food_type, food_ratings in foods.items()})
+
+
+# Record each run of a panel as a profiling phase, including the runs of
+# a panel on its own as a fragment
+def profiled(phase):
+    def decorator(panel):
+        @functools.wraps(panel)
+        def run(*args, **kwargs):
+            with st.session_state.profiler.phase(phase):
+                return panel(*args, **kwargs)
+        return run
+    return decorator
+
+
+# Show the per phase timings of the recent reruns in the sidebar
+def profiling_panel(profiler):
+    with st.sidebar.expander("**Profiling**", expanded=True):
+        summary = profiler.summary()
+        if summary is None:
+            st.caption("No phases recorded yet")
+            return
+        st.dataframe(summary.round(1), use_container_width=True)
+        phase = st.selectbox("Phase", list(summary.index),
+                             key="profile_phase")
+        st.bar_chart(profiler.histogram(phase))
+        st.caption(f"Times of the last {profiler.history} runs of the phase")
+
+
+# Show how long a panel took to run alongside the last full app run
+def show_run_time(panel, start):
+    run_times = st.session_state.run_times
+    run_times[panel] = (time.perf_counter() - start) * 1000
+    full_app = run_times.get("full app")
+    st.caption(f"{panel} ran in {run_times[panel]:.0f} ms"
+               + (f", last full app run {full_app:.0f} ms"
+                  if full_app is not None else ""))
+
+
+# The food list panel, selecting a food type and rating its foods or
+# adding a new food. Adding a food redraws the food list so both are in
+# the same panel
+@st.fragment
+@profiled("food list")
+def food_list_panel(foods):
+    start = time.perf_counter()
+
+    # Keys of the widgets created for the foods in this run
+    widget_keys = WidgetKeys(st.session_state.csv_file_hash)
 
     # Create a selectbox to choose a food type
-    food_type = st.selectbox("Select a food type", list(foods.keys()), index=0)
+    food_type = st.selectbox("Select a food type", list(foods.keys()), index=0,
+                             on_change=reset_food_page)
+
+    # Table mode shows the whole food type as a single editable table
+    # instead of one radio button per food
+    table_mode = st.toggle("Table mode", key="table_mode",
+                           help="Edit every food in the food type in a "
+                           "single table")
+
+    search_col, size_col, page_col = st.columns([0.5, 0.25, 0.25])
+    with search_col:
+        search = st.text_input("Search foods", key="food_search",
+                               on_change=reset_food_page)
+
+    matching_foods = filter_foods(foods[food_type], search)
+
+    # create a placeholder to display the food table
+    rating_table_ph = st.empty()
+
+    if table_mode:
+        table_key = rating_table_key(widget_keys, food_type, search)
+        with rating_table_ph.container():
+            edit_rating_table(foods, food_type, matching_foods, table_key)
+
+        rating_col, apply_col = st.columns([0.3, 0.7])
+        with rating_col:
+            st.selectbox("Set selected foods to", ratings, key="bulk_rating")
+        with apply_col:
+            st.button("Apply to selected", on_click=apply_bulk_rating,
+                      args=(foods, food_type, matching_foods, table_key))
+    else:
+        with size_col:
+            page_size = st.selectbox("Foods per page", page_sizes,
+                                     key="food_page_size",
+                                     on_change=reset_food_page)
+
+        pages = page_count(len(matching_foods), page_size)
+
+        # Keep the page in range if the list has become shorter
+        st.session_state.food_page = min(st.session_state.food_page, pages)
+
+        with page_col:
+            page = st.number_input(f"Page (of {pages})", min_value=1,
+                                   max_value=pages, step=1, key="food_page")
+
+        page_foods = page_slice(matching_foods, page, page_size)
+        first_food = (page - 1) * page_size
+        st.caption(f"Showing {first_food + min(1, len(page_foods))}-"
+                   f"{first_food + len(page_foods)} of "
+                   f"{len(matching_foods)} foods")
 
     # create a placeholder to display the food list
     select_food_ph = st.empty()
 
-    with select_food_ph.container(border=True):
-        # Create a column for the food type and a column for the ratings
-        ft_col, rt_col = st.columns([0.3, 0.7])
-
-        # List through the food type and display the food list as a
-        # set of radio buttons that are automatically set to the user's rating
-        for food, rating in foods[food_type].items():
-            with ft_col:
-                st.write(food)
-            with rt_col:
-                foods[food_type][food] = st.radio(food,
-                                                  ratings,
-                                                  index=ratings.index(rating),
-                                                  horizontal=True,
-                                                  label_visibility="collapsed",
-                                                  key=food)
+    if not table_mode:
+        with select_food_ph.container(border=True):
+            # Create a column for the food type and a column for the ratings
+            ft_col, rt_col = st.columns([0.3, 0.7])
+
+            # List through the foods on the current page and display them
+            # as a set of radio buttons that are automatically set to the
+            # user's rating. Ratings for foods on other pages stay in the
+            # session state dictionary and are restored when their page is
+            # shown again
+            for food in page_foods:
+                with ft_col:
+                    st.write(food)
+                with rt_col:
+                    # The stored rating code is the position in ratings
+                    foods[food_type][food] = st.radio(
+                        food,
+                        ratings,
+                        index=foods[food_type].code(food),
+                        horizontal=True,
+                        label_visibility="collapsed",
+                        key=widget_keys.key(food_type, "rating", food))
 
     # Create a text input to add a new food item
     add_food_ph = st.empty()
     new_food = add_food_ph.text_input("Add a new food",
-                                      key="new_food"+str(len(foods[food_type]))) # noqa E501
+                                      key=widget_keys.key(food_type, "new_food_"+str(len(foods[food_type])))) # noqa E501
 
     if st.button("Add Food"):
-        if new_food:
+        if new_food and table_mode:
+            foods[food_type][new_food] = "review"
+
+            # Redraw the table with the new food using a fresh table key
+            st.session_state.rating_table_version += 1
+            matching_foods = filter_foods(foods[food_type], search)
+            with rating_table_ph.container():
+                edit_rating_table(foods, food_type, matching_foods,
+                                  rating_table_key(widget_keys, food_type,
+                                                   search))
+
+            # Reset the text input for the next entry
+            add_food_ph.text_input("Add a new food", value="",
+                                   key=widget_keys.key(food_type, "new_food_"+str(len(foods[food_type])))) # noqa E501
+        elif new_food:
             with select_food_ph.container(border=True):
                 with ft_col:
                     st.write(new_food)
@@ -262,41 +620,349 @@ if uploaded_file is not None:
                                                             ),
                                                           horizontal=True,
                                                           label_visibility="collapsed", # noqa E501
-                                                          key=new_food)
+                                                          key=widget_keys.key(food_type, "rating", new_food)) # noqa E501
 
                     # Reset the text input for the next entry
                     add_food_ph.text_input("Add a new food", value="",
-                                        key="new_food"+str(len(foods[food_type]))) # noqa E501
+                                        key=widget_keys.key(food_type, "new_food_"+str(len(foods[food_type])))) # noqa E501
         else:
             st.warning("No food entered")
 
-    st.divider()
+    # Write this run's rating changes to the database in one transaction
+    if st.session_state.ratings_db is not None:
+        st.session_state.ratings_db.flush()
+
+    # Only the food widgets shown in this run keep their state, the rating
+    # of a food is kept in the ratings store when its widget is dropped
+    dropped = widget_keys.collect(st.session_state)
+    keys, food_widgets, widget_bytes = session_state_size(st.session_state)
+    st.caption(f"Session state: {keys} keys, {food_widgets} food widgets "
+               f"({widget_bytes / 1024:.1f} KB), {dropped} stale widgets "
+               "dropped")
+
+    show_run_time("Food list", start)
+
+    # The search results and summary are drawn outside this panel, when
+    # they are shown and a rating changed since they were drawn the whole
+    # app is rerun to redraw them
+    if (st.session_state.rating_stats.changes
+            != st.session_state.panel_rating_changes
+            and (st.session_state.get("all_food_search", "").strip()
+                 or st.session_state.get("show_rating_summary"))):
+        st.rerun()
+
+
+# The save panel, writing the ratings to a CSV, Parquet or Feather file
+@st.fragment
+@profiled("save panel")
+def save_panel(foods):
+    start = time.perf_counter()
 
     wf_col, space_col, lg_col = st.columns(3)
     csv_written = None
 
     csv_output_ph = st.empty()
 
-    with lg_col:
-        # Create a button to save the user's data to a CSV file
-        if st.button("Save CSV - Long Format"):
-            # Format the data from the dictionary
-            dataframe = format_data(type="long", data=foods)
+    with space_col:
+        file_type_label = st.selectbox("File type", list(save_file_types),
+                                       key="save_file_type")
+        file_type = save_file_types[file_type_label]
+        # Parquet and Feather files are compressed by their own format
+        compress = st.checkbox("Compress CSV (gzip)", key="compress_csv",
+                               disabled=file_type != "csv")
+
+    # Show the progress of a CSV being written in the output placeholder
+    def show_progress(rows_written, total_rows):
+        csv_output_ph.progress(rows_written / total_rows,
+                               text=f"Saved {rows_written} of {total_rows} "
+                               "rows")
+
+    # Write the ratings to a new file in the long or wide format. The
+    # session id is part of the file prefix so a save only deletes the
+    # older files of the same session
+    def save(type):
+        file_prefix = f"{output_file_prefix}_{get_session_id()}"
+        with st.session_state.profiler.phase(f"write {file_type}"):
+            if file_type == "csv":
+                # Stream the data from the ratings store to a new CSV file
+                return write_csv(file_prefix, type, foods,
+                                 compress=compress, progress=show_progress)
+            with st.spinner(f"Saving {file_type_label} file"):
+                return write_binary(file_prefix, type, foods, file_type)
 
-            # Save the data to a CSV file
-            csv_written, error = write_csv(f"{output_file_prefix}.csv",
-                                           dataframe)
+    with lg_col:
+        # Create a button to save the user's data to a file
+        if st.button(f"Save {file_type_label} - Long Format"):
+            csv_written, error, csv_file_path = save("long")
 
     with wf_col:
-        # Create a button to save the user's data to a CSV file
-        if st.button("Save CSV - Wide Format"):
-            dataframe = format_data(type="wide", data=foods)
-
-            # Save the data to a CSV file
-            csv_written, error = write_csv(f"{output_file_prefix}.csv",
-                                           dataframe)
+        # Create a button to save the user's data to a file
+        if st.button(f"Save {file_type_label} - Wide Format"):
+            csv_written, error, csv_file_path = save("wide")
 
     if csv_written is not None and csv_written is True:
-        csv_output_ph.success(f"Data saved to {output_file_prefix}.csv")
+        csv_output_ph.success(f"Data saved to {csv_file_path}")
     elif csv_written is not None and csv_written is False:
         csv_output_ph.error(error)
+
+    show_run_time("Save", start)
+
+
+# The search panel, finds foods by name in every food type and shows their
+# current rating
+@st.fragment
+@profiled("search panel")
+def search_panel(food_finder, foods):
+    start = time.perf_counter()
+
+    search = st.text_input("Find a food in any food type",
+                           key="all_food_search")
+    if search.strip():
+        search_start = time.perf_counter()
+        matches = food_finder.search(search)
+        search_time = (time.perf_counter() - search_start) * 1000
+
+        st.caption(f"{len(matches)} matching foods"
+                   + (f" (showing the first {search_limit})"
+                      if len(matches) == search_limit else "")
+                   + f" found in {search_time:.1f} ms")
+        st.dataframe(pd.DataFrame({
+            "food_type": [food_type for food_type, food in matches],
+            "food": [food for food_type, food in matches],
+            "rating": [foods[food_type][food]
+                       for food_type, food in matches],
+        }), hide_index=True, use_container_width=True)
+
+    show_run_time("Search", start)
+
+
+# The ratings summary panel, rating counts per food type and the foods
+# that are loved and disliked
+@st.fragment
+@profiled("summary panel")
+def summary_panel(rating_stats):
+    start = time.perf_counter()
+
+    with st.expander("**Ratings Summary**"):
+        if st.toggle("Show summary", key="show_rating_summary"):
+            st.dataframe(rating_stats.summary(), use_container_width=True)
+
+            love_col, dislike_col = st.columns(2)
+            with love_col:
+                st.write("Loved foods")
+                st.dataframe(pd.DataFrame(rating_stats.foods_rated("love"),
+                                          columns=["food_type", "food"]),
+                             hide_index=True, use_container_width=True)
+            with dislike_col:
+                st.write("Disliked foods")
+                st.dataframe(pd.DataFrame(
+                    rating_stats.foods_rated("dislike"),
+                    columns=["food_type", "food"]),
+                    hide_index=True, use_container_width=True)
+
+            if st.button("Save Summary CSV"):
+                try:
+                    rating_stats.write_summary(summary_file_path)
+                    st.success(f"Summary saved to {summary_file_path}")
+                except Exception as e:
+                    st.error(f"An error occurred: {e}")
+
+    show_run_time("Summary", start)
+
+
+# Files are uploaded or, when the server has a data directory, picked from
+# it
+data_source = "Upload"
+if dataset_directory and os.path.isdir(dataset_directory):
+    data_source = st.sidebar.radio("Load files from", ["Upload", "Server"],
+                                   key="data_source", horizontal=True)
+
+if data_source == "Server":
+    # Only names listed in the directory can be picked, so no other path on
+    # the server can be opened
+    dataset = st.sidebar.selectbox(
+        f"Choose a file in {dataset_directory}",
+        list_datasets(dataset_directory), index=None, key="dataset")
+    files = []
+    source_hashes = None
+    if dataset is not None:
+        files = [(dataset, os.path.join(dataset_directory, dataset))]
+else:
+    # Add a sidebar that allows the user to upload one or more CSV, Parquet
+    # or Feather files
+    uploaded_files = st.sidebar.file_uploader(
+        "Choose CSV, Parquet or Feather files", type=upload_file_types,
+        accept_multiple_files=True)
+    files = [(uploaded_file.name, uploaded_file.getvalue())
+             for uploaded_file in uploaded_files]
+
+    # An upload keeps its file id until it is removed, so each upload is
+    # only hashed once rather than on every rerun
+    upload_hashes = st.session_state.upload_hashes
+    st.session_state.upload_hashes = {
+        uploaded_file.file_id: (upload_hashes.get(uploaded_file.file_id)
+                                or source_hash(source))
+        for uploaded_file, (name, source) in zip(uploaded_files, files)}
+    source_hashes = [st.session_state.upload_hashes[uploaded_file.file_id]
+                     for uploaded_file in uploaded_files]
+
+merge_policy = merge_policies[0]
+if len(files) > 1:
+    merge_policy = st.sidebar.selectbox(
+        "When files rate the same food", merge_policies, key="merge_policy",
+        help="last wins - the file uploaded last, most recent - the file "
+        "with the newest timestamp in its name, prefer rated - a review "
+        "rating never replaces another rating")
+
+# Ratings are kept in the database under the user name, a blank name is
+# no user (None) as for a session without a database
+user_name = None
+if ratings_db_path:
+    user_name = (st.sidebar.text_input("User name", key="user_name").strip()
+                 or None)
+    if user_name is None:
+        st.sidebar.info("Enter a user name to keep your ratings")
+
+# Stop loading files that have been removed from the uploader
+if not files and st.session_state.parse_job is not None:
+    st.session_state.parse_job.cancel()
+    st.session_state.parse_job = None
+
+if files:
+    file_hash = files_hash(files, merge_policy, source_hashes)
+
+    # Ensure all persistent data is reset when the files (or a server
+    # file's contents), the merge policy or the user change
+    ratings_db = st.session_state.ratings_db
+    db_user = ratings_db.user if ratings_db is not None else None
+    if st.session_state.csv_file_hash != file_hash or db_user != user_name:
+        reset_session_state()
+        st.session_state.csv_file_name = ", ".join(
+            name for name, source in files)
+        st.session_state.csv_file_hash = file_hash
+
+    # Read the CSV into a DataFrame, or reuse the cached one, only until the
+    # session has built its ratings. Later reruns use the session's
+    # references to the preview, format and report, so a file that was too
+    # large to cache or has since been evicted is not parsed again
+    if st.session_state.build_food_dict:
+        with st.session_state.profiler.phase("parse csv"):
+            df, loaded_foods, csv_format, validation_report = load_csv(
+                files, file_hash, merge_policy)
+        st.session_state.loaded_file = (df, csv_format, validation_report)
+    else:
+        df, csv_format, validation_report = st.session_state.loaded_file
+
+    parse_cache = get_parse_cache()
+    st.sidebar.caption(f"CSV cache: {parse_cache.hits} hits, "
+                       f"{parse_cache.misses} misses, "
+                       f"{len(parse_cache)} files")
+
+    # Problems found when validating the loaded rows, the rows have already
+    # been fixed or skipped so this is a summary rather than an error
+    if validation_report:
+        with st.expander(f"**Validation report** ({len(validation_report)} "
+                         "problems fixed or skipped)"):
+            st.dataframe(validation_report.summary(), hide_index=True,
+                         use_container_width=True)
+
+    # The contents of an expander are sent to the browser even when it is
+    # collapsed, so the data is only shown once its toggle is switched on
+    with st.expander("**Original CSV Dataframe**"):
+        if st.toggle("Show data", key="show_csv_dataframe"):
+            if csv_format == "long":
+                st.caption("Long format CSV, only the first "
+                           f"{len(df)} rows are kept for display")
+            with st.session_state.profiler.phase("csv preview"):
+                preview_dataframe(df)
+
+    # Build a dictionary from the data in the uploaded CSV
+    # Only do this the first time a CSV is loaded
+    if st.session_state.build_food_dict:
+        with st.session_state.profiler.phase("build ratings"):
+            st.session_state.foods = loaded_foods.copy()
+
+            # Search the shared index of the loaded foods and index the
+            # foods added to this session as they are added
+            food_finder = FoodSearch(get_search_index(file_hash,
+                                                      loaded_foods))
+            food_finder.attach(st.session_state.foods)
+            st.session_state.food_finder = food_finder
+
+            # Read the user's ratings of this file from the database, store
+            # the loaded ratings the database does not have yet, then write
+            # all further changes through
+            if user_name:
+                ratings_db = SQLiteRatings(ratings_db_path, user_name,
+                                           file_hash)
+                ratings_db.load(st.session_state.foods)
+                ratings_db.save(st.session_state.foods, replace=False)
+                ratings_db.attach(st.session_state.foods)
+                st.session_state.ratings_db = ratings_db
+
+            # Restore any autosaved changes and journal all further changes.
+            # Each user has their own journal for the file, the journals of
+            # sessions that have not changed a rating for a week are deleted
+            remove_old_journals(journal_directory)
+            journal = RatingJournal(
+                journal_directory, get_session_id(),
+                content_hash(f"{file_hash}:{user_name or ''}".encode()))
+            if journal.exists():
+                journal.replay(st.session_state.foods)
+                st.toast("Restored autosaved ratings")
+            journal.attach(st.session_state.foods)
+            st.session_state.journal = journal
+
+            # Count the ratings once, the counts are then updated as they
+            # change
+            rating_stats = RatingStats()
+            rating_stats.attach(st.session_state.foods)
+            st.session_state.rating_stats = rating_stats
+
+            # Indicate the dictionary does not need building
+            st.session_state.build_food_dict = False
+
+    # Create a reference to the session state dictionary
+    foods = st.session_state.foods
+
+    if not foods:
+        st.error("No food types found in the CSV file")
+        st.stop()
+
+    with st.expander("**Dictionary**"):
+        if st.toggle("Show data", key="show_foods_dictionary"):
+            with st.session_state.profiler.phase("dictionary preview"):
+                preview_foods(foods)
+
+    # The search and summary panels are drawn with the ratings as they are
+    # now
+    st.session_state.panel_rating_changes = (
+        st.session_state.rating_stats.changes)
+
+    search_panel(st.session_state.food_finder, foods)
+
+    food_list_panel(foods)
+
+    # Shown after the food list has written this run's changes
+    if st.session_state.ratings_db is not None:
+        users, rating_counts = get_dataset_totals(ratings_db_path, file_hash)
+        st.sidebar.caption(
+            f"All users ({users}): " + ", ".join(
+                f"{rating} {count}" for rating, count in rating_counts)
+            + f", updated every {dataset_totals_ttl} s")
+
+    st.divider()
+
+    save_panel(foods)
+
+    summary_panel(st.session_state.rating_stats)
+
+    # Time of the last full run of the script, a widget inside a panel only
+    # reruns that panel
+    st.session_state.run_times["full app"] = (
+        (time.perf_counter() - app_start) * 1000)
+
+st.session_state.profiler.end_rerun()
+
+if st.session_state.profiler.enabled:
+    profiling_panel(st.session_state.profiler)
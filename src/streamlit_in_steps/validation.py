@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+# Validation - Check and normalise the foods and ratings of a loaded file
+# before the foods dictionary is built
+#
+# Each column is normalised with array operations rather than row by row.
+# Names are stripped with pandas string methods. A rating column is
+# factorised into its distinct values and codes, only the distinct values
+# are matched (there are a handful of distinct ratings even in a file with
+# millions of rows) and the matched ratings are then taken back out by
+# code:
+# - food and food type names are text with surrounding whitespace removed,
+#   an empty name is missing
+# - ratings are matched to the allowed ratings ignoring case and
+#   whitespace, so "Love " becomes "love". Missing and unknown ratings
+#   become default_rating so every loaded food can be shown and rated
+#
+# Problems are counted in a ValidationReport, with a few example rows for
+# each kind of problem, rather than raised one row at a time. Rows are
+# numbered from 1 for the first row after the header.
+
+# The ratings a loaded file may use, in the order they are shown
+allowed_ratings = ["love", "like", "indifferent", "dislike", "review"]
+
+# Rating given to foods without a rating or with an unknown rating
+default_rating = "review"
+
+# Number of example rows kept for each kind of problem
+report_examples = 5
+
+
+class ValidationReport:
+    def __init__(self):
+        # Number of rows and example rows for each problem, in the order
+        # the problems are first found
+        self.counts = {}
+        self.examples = {}
+
+    # Record a problem for the rows, values are the offending values shown
+    # with the example rows
+    def add(self, problem, rows, values=None):
+        if not len(rows):
+            return
+        self.counts[problem] = self.counts.get(problem, 0) + len(rows)
+        examples = self.examples.setdefault(problem, [])
+        room = report_examples - len(examples)
+        if room <= 0:
+            return
+        rows = list(rows[:room])
+        if values is None:
+            examples += [f"row {row}" for row in rows]
+        else:
+            examples += [f"row {row} ({value!r})"
+                         for row, value in zip(rows, list(values[:room]))]
+
+    # Add the problems of another report, e.g. one per file when several
+    # files are loaded, naming the source in its example rows
+    def extend(self, other, source):
+        for problem, count in other.counts.items():
+            self.counts[problem] = self.counts.get(problem, 0) + count
+            examples = self.examples.setdefault(problem, [])
+            room = report_examples - len(examples)
+            examples += [f"{source} {example}"
+                         for example in other.examples[problem][:room]]
+
+    # Total number of problems found
+    def __len__(self):
+        return sum(self.counts.values())
+
+    # Return a DataFrame with one row per problem
+    def summary(self):
+        return pd.DataFrame({
+            "problem": list(self.counts),
+            "rows": list(self.counts.values()),
+            "examples": [", ".join(self.examples[problem])
+                         for problem in self.counts],
+        })
+
+
+# Normalise an array of food or food type names, every name is returned
+# as text so a food has the same name (and key) however its file was read.
+# Returns (names, missing, fixed) where missing names are None and fixed
+# flags the names that had surrounding whitespace
+def normalize_names(values):
+    names = np.asarray(values, dtype=object)
+    missing = pd.isna(names)
+    if pd.api.types.infer_dtype(names[~missing]) != "string":
+        # Numbers (or a mix of numbers and text), e.g. from a Parquet file
+        names = names.copy()
+        names[~missing] = list(map(str, names[~missing].tolist()))
+    cleaned = names.copy()
+    cleaned[~missing] = list(map(str.strip, names[~missing].tolist()))
+    fixed = ~missing & (cleaned != names)
+    missing |= cleaned == ""
+    cleaned[missing] = None
+    return cleaned, missing, fixed
+
+
+# Match an array of ratings to the allowed ratings.
+# Returns (ratings, missing, fixed, unknown) where missing and unknown
+# ratings are replaced with the default rating and fixed flags the ratings
+# whose case or whitespace was changed
+def normalize_ratings(values, ratings=allowed_ratings,
+                      default=default_rating):
+    codes, uniques = pd.factorize(values)
+    lookup = {rating.lower(): rating for rating in ratings}
+    matched = [lookup.get(" ".join(str(rating).split()).lower())
+               for rating in uniques]
+
+    fixed = np.array([match is not None and match != rating
+                      for match, rating in zip(matched, uniques)] + [False])
+    unknown = np.array([match is None for match in matched] + [False])
+    cleaned = np.array([default if match is None else match
+                        for match in matched] + [default], dtype=object)
+    return cleaned[codes], codes == -1, fixed[codes], unknown[codes]
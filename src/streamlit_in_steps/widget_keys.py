@@ -0,0 +1,76 @@
+import hashlib
+import sys
+
+# Widget Keys - Namespaced session state keys for the widgets created for
+# each food, and clean up of their state
+#
+# Streamlit keeps the state of every keyed widget in st.session_state. The
+# food list creates a radio button per food shown and an input per added
+# food, so keying them by the food name alone lets their state pile up as
+# pages, food types and files change, and lets "apple" in two food types
+# (or a food named like a session state variable) share a key.
+#
+# Keys are instead built from the loaded file, the food type and an id of
+# the food, e.g.
+# food_widget/1a2b3c4d5e6f/<food type id>/<food id>/rating
+# Each run of the food list records the keys it uses with a WidgetKeys and
+# then drops the state of every other food widget, so the state held is
+# bounded by the foods on screen rather than every food ever shown.
+
+# Prefix of the session state key of every food widget
+widget_key_prefix = "food_widget/"
+
+# Number of hex digits of the file hash and of each name id in a key
+key_id_length = 12
+
+
+# Return a short id for a food type or food name, the id is the same for
+# the same name in every run
+def name_id(name):
+    return hashlib.blake2b(str(name).encode("utf-8"),
+                           digest_size=key_id_length // 2).hexdigest()
+
+
+class WidgetKeys:
+    def __init__(self, file_hash):
+        self.namespace = (f"{widget_key_prefix}"
+                          f"{(file_hash or '')[:key_id_length]}/")
+        # Keys used by this run
+        self.used = set()
+
+    # Return the key of a widget of a food type, of one of its foods if
+    # food is given, and record it as used by this run
+    def key(self, food_type, widget, food=None):
+        parts = [name_id(food_type)]
+        if food is not None:
+            parts.append(name_id(food))
+        key = self.namespace + "/".join(parts + [widget])
+        self.used.add(key)
+        return key
+
+    # Drop the state of the food widgets not used by this run.
+    # Returns the number of keys dropped
+    def collect(self, session_state):
+        stale = [key for key in list(session_state.keys())
+                 if str(key).startswith(widget_key_prefix)
+                 and key not in self.used]
+        for key in stale:
+            del session_state[key]
+        return len(stale)
+
+
+# Drop the state of every food widget, e.g. when a different file is loaded
+def clear_widget_state(session_state):
+    return WidgetKeys(None).collect(session_state)
+
+
+# Return the size of the session state as a tuple of (number of keys,
+# number of food widget keys, approximate bytes held by the food widget
+# state)
+def session_state_size(session_state):
+    keys = list(session_state.keys())
+    widget_keys = [key for key in keys
+                   if str(key).startswith(widget_key_prefix)]
+    widget_bytes = sum(sys.getsizeof(key) + sys.getsizeof(session_state[key])
+                       for key in widget_keys)
+    return len(keys), len(widget_keys), widget_bytes
@@ -0,0 +1,69 @@
+from streamlit_in_steps.cache import LRUCache, content_hash
+
+
+def test_content_hash_ignores_the_file_name():
+    assert content_hash(b"fruit\napple\n") == content_hash(b"fruit\napple\n")
+    assert content_hash(b"fruit\napple\n") != content_hash(b"fruit\npear\n")
+
+
+def test_eviction_by_entry_count():
+    cache = LRUCache(max_entries=2, max_bytes=100)
+    cache.put("a", 1, 10)
+    cache.put("b", 2, 10)
+    # Reading a marks it as the most recently used, b is evicted instead
+    assert cache.get("a") == 1
+    cache.put("c", 3, 10)
+
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+    assert len(cache) == 2
+    assert cache.total_bytes == 20
+
+
+def test_eviction_by_total_bytes():
+    cache = LRUCache(max_entries=10, max_bytes=100)
+    cache.put("a", 1, 40)
+    cache.put("b", 2, 40)
+    cache.put("c", 3, 40)
+
+    assert "a" not in cache
+    assert len(cache) == 2
+    assert cache.total_bytes == 80
+
+    # Replacing an entry counts only its new size
+    cache.put("b", 4, 70)
+    assert cache.get("b") == 4
+    assert "c" not in cache
+    assert cache.total_bytes == 70
+
+
+def test_entries_larger_than_the_cache_are_refused():
+    cache = LRUCache(max_entries=10, max_bytes=100)
+    cache.put("a", 1, 50)
+    cache.put("b", 2, 101)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.total_bytes == 50
+
+    # An oversize value replacing a cached one drops the old value
+    cache.put("a", 3, 101)
+    assert "a" not in cache
+    assert cache.total_bytes == 0
+
+
+def test_hits_and_misses():
+    cache = LRUCache(max_entries=2, max_bytes=100)
+    assert cache.get("a") is None
+    cache.put("a", 1, 10)
+    assert cache.get("a") == 1
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.total_bytes == 0
+    assert cache.get("a") is None
+    assert cache.misses == 3
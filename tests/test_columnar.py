@@ -0,0 +1,92 @@
+import io
+
+import pyarrow as pa
+import pytest
+
+from streamlit_in_steps.columnar import (binary_file_format, load_file,
+                                         read_table, to_arrow_table,
+                                         write_binary)
+from streamlit_in_steps.store import RatingStore
+
+foods = {"fruit": {"apple": "like", "pear": "love", "kiwi": "review"},
+         "meat": {"beef": "dislike"}}
+
+
+def test_binary_file_format():
+    assert binary_file_format("ratings.parquet") == "parquet"
+    assert binary_file_format("ratings.FEATHER") == "feather"
+    assert binary_file_format("ratings.arrow") == "feather"
+    assert binary_file_format("ratings.csv") is None
+
+
+def test_wide_table_pads_with_nulls_and_encodes_ratings():
+    table = to_arrow_table("wide", foods)
+
+    assert table.column_names == ["fruit", "fruit_rating",
+                                  "meat", "meat_rating"]
+    # The shorter food type is padded with nulls, not empty strings
+    assert table["meat"].to_pylist() == ["beef", None, None]
+    assert table["meat_rating"].to_pylist() == ["dislike", None, None]
+    for column in ["fruit_rating", "meat_rating"]:
+        assert pa.types.is_dictionary(table.schema.field(column).type)
+    assert not pa.types.is_dictionary(table.schema.field("fruit").type)
+
+
+def test_long_table_encodes_food_types_and_ratings():
+    table = to_arrow_table("long", foods)
+
+    assert table.column_names == ["food_type", "food", "rating"]
+    for column in ["food_type", "rating"]:
+        assert pa.types.is_dictionary(table.schema.field(column).type)
+    assert not pa.types.is_dictionary(table.schema.field("food").type)
+
+
+@pytest.mark.parametrize("binary_format", ["parquet", "feather"])
+@pytest.mark.parametrize("layout", ["long", "wide"])
+def test_round_trip_from_a_path(tmp_path, binary_format, layout):
+    store = RatingStore.from_dict(
+        foods, ["love", "like", "indifferent", "dislike", "review"])
+    success, error, path = write_binary(str(tmp_path / "food_ratings"),
+                                        layout, store, binary_format)
+    assert success, error
+    assert path.endswith(f".{binary_format}")
+
+    # The dictionary encoding of the ratings is kept in the file
+    table = read_table(path, binary_format)
+    rating_column = "rating" if layout == "long" else "fruit_rating"
+    assert pa.types.is_dictionary(table.schema.field(rating_column).type)
+
+    progress = []
+    df, loaded, csv_format = load_file(
+        path, path, lambda *update: progress.append(update))
+
+    assert csv_format == layout
+    assert loaded == foods
+    assert progress == [(len(df), 2)]
+
+
+@pytest.mark.parametrize("binary_format", ["parquet", "feather"])
+@pytest.mark.parametrize("layout", ["long", "wide"])
+def test_round_trip_from_bytes(tmp_path, binary_format, layout):
+    success, error, path = write_binary(str(tmp_path / "food_ratings"),
+                                        layout, foods, binary_format)
+    assert success, error
+    with open(path, "rb") as binary_file:
+        data = binary_file.read()
+
+    # An upload is a file object, a file from the server may be raw bytes
+    for file in [io.BytesIO(data), data]:
+        df, loaded, csv_format = load_file(f"upload.{binary_format}", file)
+
+        assert csv_format == layout
+        assert loaded == foods
+        # Ratings are loaded as plain strings, not categories
+        assert all(dtype == object for dtype in df.dtypes)
+
+
+def test_missing_directory_is_reported(tmp_path):
+    success, error, path = write_binary(str(tmp_path / "missing" / "food"),
+                                        "long", foods, "parquet")
+
+    assert not success
+    assert error == f"Directory {tmp_path / 'missing'} not found"
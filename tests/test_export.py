@@ -0,0 +1,41 @@
+import os
+
+from streamlit_in_steps.export import (apply_retention, versioned_file_path,
+                                       write_csv)
+from streamlit_in_steps.merge import file_timestamp
+
+
+def test_retention_is_kept_per_prefix(tmp_path):
+    first = str(tmp_path / "food_ratings_0123456789abcdef0123456789abcdef")
+    second = str(tmp_path / "food_ratings_fedcba9876543210fedcba9876543210")
+    for number in range(3):
+        assert write_csv(second, "long", {"fruit": {"apple": "like"}})[0]
+    for number in range(4):
+        assert write_csv(first, "long", {"fruit": {"apple": "like"}},
+                         retention=2)[0]
+
+    names = os.listdir(tmp_path)
+    assert sum(name.startswith(os.path.basename(first))
+               for name in names) == 2
+    assert sum(name.startswith(os.path.basename(second))
+               for name in names) == 3
+
+
+def test_retention_ignores_longer_prefixes_and_other_files(tmp_path):
+    prefix = str(tmp_path / "food_ratings")
+    session_file = versioned_file_path(f"{prefix}_0123456789abcdef"
+                                       "0123456789abcdef")
+    open(session_file, "w").close()
+    open(tmp_path / "food_ratings_summary.csv", "w").close()
+
+    apply_retention(prefix, retention=0)
+
+    assert sorted(os.listdir(tmp_path)) == sorted([
+        os.path.basename(session_file), "food_ratings_summary.csv"])
+
+
+def test_session_file_names_keep_their_timestamp():
+    path = versioned_file_path("output/food_ratings_0123456789abcdef"
+                               "0123456789abcdef")
+
+    assert file_timestamp(os.path.basename(path)) is not None
@@ -0,0 +1,116 @@
+import os
+
+from streamlit_in_steps.journal import RatingJournal, remove_old_journals
+from streamlit_in_steps.store import RatingStore
+
+ratings = ["love", "like", "indifferent", "dislike", "review"]
+
+
+def touch(path, modified):
+    open(path, "w").close()
+    os.utime(path, (modified, modified))
+
+
+def test_remove_old_journals_keeps_recent_sessions(tmp_path):
+    now = 1_000_000
+    touch(tmp_path / "old_abc.jsonl", now - 100)
+    touch(tmp_path / "old_abc.snapshot.csv", now - 100)
+    # A snapshot is kept while its journal is still written to
+    touch(tmp_path / "active_abc.snapshot.csv", now - 100)
+    touch(tmp_path / "active_abc.jsonl", now - 1)
+    touch(tmp_path / "other.txt", now - 100)
+
+    assert remove_old_journals(tmp_path, max_age=50, now=now) == 2
+    assert sorted(os.listdir(tmp_path)) == [
+        "active_abc.jsonl", "active_abc.snapshot.csv", "other.txt"]
+
+
+def test_remove_old_journals_missing_directory(tmp_path):
+    assert remove_old_journals(tmp_path / "missing") == 0
+
+
+def make_store():
+    return RatingStore.from_dict({"fruit": {"apple": "like",
+                                            "pear": "review"}}, ratings)
+
+
+def test_replay_applies_the_journal(tmp_path):
+    journal = RatingJournal(tmp_path, "session", "0123456789abcdef")
+    store = make_store()
+    journal.attach(store)
+    store["fruit"]["apple"] = "love"
+    store["fruit"]["plum"] = "dislike"
+
+    restored = make_store()
+    rebuilt = RatingJournal(tmp_path, "session", "0123456789abcdef")
+    assert rebuilt.exists()
+    rebuilt.replay(restored)
+
+    assert restored.to_dict() == store.to_dict()
+    assert rebuilt.records == 2
+
+
+def test_replay_adds_new_food_types(tmp_path):
+    journal = RatingJournal(tmp_path, "session", "0123456789abcdef")
+    store = make_store()
+    journal.attach(store)
+    store.setdefault("veg", {})["leek"] = "like"
+
+    restored = make_store()
+    journal.replay(restored)
+
+    assert restored["veg"]["leek"] == "like"
+    assert restored.to_dict() == store.to_dict()
+
+
+def test_replay_skips_a_partly_written_record(tmp_path):
+    journal = RatingJournal(tmp_path, "session", "0123456789abcdef")
+    store = make_store()
+    journal.attach(store)
+    store["fruit"]["apple"] = "love"
+    with open(journal.journal_path, "a", encoding="utf-8") as journal_file:
+        journal_file.write('{"food_type": "fruit", "fo')
+
+    restored = make_store()
+    journal.replay(restored)
+
+    assert restored.to_dict() == store.to_dict()
+
+
+def test_compact_writes_a_snapshot_and_empties_the_journal(tmp_path):
+    journal = RatingJournal(tmp_path, "session", "0123456789abcdef",
+                            compact_every=2)
+    store = make_store()
+    journal.attach(store)
+    store["fruit"]["apple"] = "love"
+    store.setdefault("veg", {})["leek"] = "like"
+
+    assert os.path.exists(journal.snapshot_path)
+    assert os.path.getsize(journal.journal_path) == 0
+    assert journal.records == 0
+
+    restored = make_store()
+    RatingJournal(tmp_path, "session", "0123456789abcdef").replay(restored)
+    assert restored.to_dict() == store.to_dict()
+
+
+def test_replay_applies_the_journal_after_the_snapshot(tmp_path):
+    journal = RatingJournal(tmp_path, "session", "0123456789abcdef",
+                            compact_every=2)
+    store = make_store()
+    journal.attach(store)
+    store["fruit"]["apple"] = "love"
+    store["fruit"]["pear"] = "like"
+    # Written to the journal after the snapshot
+    store["fruit"]["apple"] = "dislike"
+    store.setdefault("veg", {})["leek"] = "indifferent"
+    assert journal.records == 0
+    store["fruit"]["plum"] = "love"
+
+    restored = make_store()
+    RatingJournal(tmp_path, "session", "0123456789abcdef").replay(restored)
+
+    assert restored.to_dict() == {
+        "fruit": {"apple": "dislike", "pear": "like", "plum": "love"},
+        "veg": {"leek": "indifferent"},
+    }
@@ -0,0 +1,118 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+from streamlit_in_steps.merge import file_timestamp, merge_foods, parse_files
+from streamlit_in_steps.validation import ValidationReport
+
+long_file = (b"food_type,food,rating\n"
+             b"fruit,apple,like\n"
+             b"fruit,pear,Love\n")
+wide_file = (b"fruit,fruit_rating,meat,meat_rating\n"
+             b"apple,dislike,beef,like\n"
+             b"kiwi,,,\n")
+
+
+def test_file_timestamp():
+    assert file_timestamp(
+        "food_ratings_0123456789abcdef0123456789abcdef_"
+        "20240315-101502-123456_1a2b3c4d.csv") == datetime(
+            2024, 3, 15, 10, 15, 2, 123456)
+    assert file_timestamp("ratings_20240315-101502.csv") == datetime(
+        2024, 3, 15, 10, 15, 2)
+    assert file_timestamp("ratings.csv") is None
+    assert file_timestamp("ratings_20241399-101502.csv") is None
+
+
+def test_last_wins():
+    merged = merge_foods([
+        ("first.csv", {"fruit": {"apple": "like", "pear": "love"}}),
+        ("second.csv", {"fruit": {"apple": "review", "kiwi": "like"},
+                        "meat": {"beef": "love"}}),
+    ], "last wins")
+
+    assert merged == {"fruit": {"apple": "review", "pear": "love",
+                                "kiwi": "like"},
+                      "meat": {"beef": "love"}}
+    # Foods keep the order they are first seen in
+    assert list(merged["fruit"]) == ["apple", "pear", "kiwi"]
+
+
+def test_most_recent_wins_and_files_without_a_timestamp_are_oldest():
+    merged = merge_foods([
+        ("ratings_20240316-090000.csv", {"fruit": {"apple": "love"}}),
+        ("ratings_20240315-090000.csv", {"fruit": {"apple": "dislike",
+                                                   "pear": "like"}}),
+        ("ratings.csv", {"fruit": {"apple": "review", "pear": "review",
+                                   "kiwi": "indifferent"}}),
+    ], "most recent")
+
+    assert merged == {"fruit": {"apple": "love", "pear": "like",
+                                "kiwi": "indifferent"}}
+
+
+def test_most_recent_keeps_upload_order_for_equal_timestamps():
+    merged = merge_foods([
+        ("a_20240315-090000.csv", {"fruit": {"apple": "love"}}),
+        ("b_20240315-090000.csv", {"fruit": {"apple": "like"}}),
+    ], "most recent")
+
+    assert merged == {"fruit": {"apple": "like"}}
+
+
+def test_prefer_rated_keeps_a_rating_over_review():
+    merged = merge_foods([
+        ("first.csv", {"fruit": {"apple": "like", "pear": "review"}}),
+        ("second.csv", {"fruit": {"apple": "review", "pear": "love"}}),
+    ], "prefer rated")
+
+    assert merged == {"fruit": {"apple": "like", "pear": "love"}}
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        merge_foods([], "first wins")
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_parse_several_files(workers):
+    files = [("a.csv", long_file), ("b.csv", wide_file)]
+    report = ValidationReport()
+    progress = []
+
+    def parse(executor):
+        return parse_files(files, lambda *update: progress.append(update),
+                           executor, "last wins", report)
+
+    if workers is None:
+        preview, foods, csv_format = parse(None)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            preview, foods, csv_format = parse(executor)
+
+    assert foods == {"fruit": {"apple": "dislike", "pear": "love",
+                               "kiwi": "review"},
+                     "meat": {"beef": "like"}}
+    assert csv_format == "mixed"
+    # The problems of each file are named by the file
+    assert report.counts == {"rating case or whitespace fixed": 1,
+                             "missing rating (set to review)": 1}
+    assert report.examples == {
+        "rating case or whitespace fixed": ["a.csv row 2"],
+        "missing rating (set to review)": ["b.csv row 2"]}
+    # The previews are stacked in upload order, keyed by file
+    assert list(preview.index.get_level_values("file")) == [
+        "a.csv", "a.csv", "b.csv", "b.csv"]
+    # One progress update per file, the last with every row and byte
+    assert len(progress) == 2
+    assert progress[-1] == (4, 2, len(long_file) + len(wide_file))
+
+
+def test_parse_files_of_the_same_format():
+    preview, foods, csv_format = parse_files(
+        [("a.csv", long_file), ("b.csv", long_file)], lambda *update: None,
+        None)
+
+    assert csv_format == "long"
+    assert foods == {"fruit": {"apple": "like", "pear": "love"}}
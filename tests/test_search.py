@@ -0,0 +1,109 @@
+import numpy as np
+
+from streamlit_in_steps.search import (FoodSearch, SearchIndex,
+                                       code_point_bits, code_points,
+                                       ngram_codes)
+from streamlit_in_steps.store import RatingStore
+
+foods = {
+    "fruit": {"Apple": "like", "Pineapple": "love", "Grape": "review",
+              "Grapefruit": "like"},
+    "vegetable": {"Apple Mint": "review", "Parsnip": "dislike"},
+}
+
+
+def make_search(store=None):
+    search = FoodSearch(SearchIndex(foods))
+    if store is not None:
+        search.attach(store)
+    return search
+
+
+def test_ngram_codes_pack_each_code_point_into_21_bits():
+    chars, lengths = code_points(["abcd"])
+
+    codes = ngram_codes(chars, np.array([0, 1]))
+
+    assert lengths.tolist() == [4]
+    assert codes.tolist() == [
+        (ord("a") << 2 * code_point_bits) | (ord("b") << code_point_bits)
+        | ord("c"),
+        (ord("b") << 2 * code_point_bits) | (ord("c") << code_point_bits)
+        | ord("d"),
+    ]
+
+
+def test_ngram_codes_keep_code_points_outside_the_basic_plane_apart():
+    # Characters needing more than 16 bits must not overlap their neighbours
+    chars, lengths = code_points(["\U0001f34exy", "xy"])
+
+    codes = ngram_codes(chars, np.array([0, 3]))
+
+    assert codes[0] != codes[1]
+    assert codes[0] >> 2 * code_point_bits == 0x1f34e
+
+
+def test_ngram_index_lists_each_entry_once_per_ngram():
+    index = SearchIndex({"fruit": {"banana": "like", "bandana": "like"}})
+    chars, lengths = code_points(["ana"])
+    code = ngram_codes(chars, np.array([0]))[0]
+
+    position = np.searchsorted(index.ngrams, code)
+    entries = index.ngram_entries[index.ngram_starts[position]:
+                                  index.ngram_starts[position + 1]]
+
+    assert entries.tolist() == [0, 1]
+
+
+def test_prefix_matches_come_first_in_name_order():
+    search = make_search()
+
+    assert search.search("apple") == [
+        ("fruit", "Apple"), ("vegetable", "Apple Mint"),
+        ("fruit", "Pineapple")]
+    assert search.search("  GRAPE ") == [
+        ("fruit", "Grape"), ("fruit", "Grapefruit")]
+
+
+def test_substring_needs_the_whole_text_not_just_its_ngrams():
+    index = SearchIndex({"fruit": {"aaa": "like", "baaaa": "like"}})
+
+    assert [index.entry(entry) for entry in index.substring("aaaa")] == [
+        ("fruit", "baaaa")]
+
+
+def test_searches_shorter_than_a_trigram():
+    search = make_search()
+
+    assert search.search("ap") == [
+        ("fruit", "Apple"), ("vegetable", "Apple Mint"),
+        ("fruit", "Pineapple"), ("fruit", "Grape"), ("fruit", "Grapefruit")]
+    # Names containing the text follow in the order they were loaded
+    assert search.search("t") == [("fruit", "Grapefruit"),
+                                  ("vegetable", "Apple Mint")]
+    assert search.search("  ") == []
+
+
+def test_search_limit():
+    search = make_search()
+
+    assert search.search("p", limit=2) == [("vegetable", "Parsnip"),
+                                           ("fruit", "Pineapple")]
+
+
+def test_foods_added_after_the_index_was_built():
+    store = RatingStore.from_dict(foods, ["love", "like", "review"])
+    search = make_search(store)
+
+    store["fruit"]["Crab Apple"] = "review"
+    store["vegetable"]["Apple Squash"] = "like"
+    # A changed rating is not added to the index again
+    store["fruit"]["Apple"] = "love"
+
+    assert search.search("apple") == [
+        ("fruit", "Apple"), ("vegetable", "Apple Mint"),
+        ("vegetable", "Apple Squash"), ("fruit", "Pineapple"),
+        ("fruit", "Crab Apple")]
+    # The shared index is not changed by a session's added foods
+    assert len(search.index) == 6
+    assert make_search().search("crab") == []
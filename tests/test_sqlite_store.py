@@ -0,0 +1,131 @@
+import sqlite3
+
+from streamlit_in_steps.sqlite_store import SQLiteRatings, dataset_totals
+from streamlit_in_steps.store import RatingStore
+
+ratings = ["love", "like", "indifferent", "dislike", "review"]
+
+
+def make_store():
+    return RatingStore.from_dict({"fruit": {"apple": "like",
+                                            "pear": "review"}}, ratings)
+
+
+def rows(path):
+    with sqlite3.connect(path) as connection:
+        return connection.execute(
+            "SELECT dataset, user, food_type, food, rating FROM ratings "
+            "ORDER BY dataset, user, food_type, food").fetchall()
+
+
+def test_save_and_load(tmp_path):
+    path = tmp_path / "ratings.db"
+    store = make_store()
+    store["fruit"]["apple"] = "love"
+    store.setdefault("veg", {})["leek"] = "dislike"
+    database = SQLiteRatings(path, "alice", "file1")
+    database.save(store)
+    database.close()
+
+    loaded = make_store()
+    database = SQLiteRatings(path, "alice", "file1")
+    database.load(loaded)
+    database.close()
+
+    assert loaded.to_dict() == store.to_dict()
+
+
+def test_save_without_replace_only_adds_missing_ratings(tmp_path):
+    path = tmp_path / "ratings.db"
+    database = SQLiteRatings(path, "alice", "file1")
+    stored = make_store()
+    stored["fruit"]["apple"] = "love"
+    database.save(stored)
+
+    loaded = make_store()
+    loaded["fruit"]["plum"] = "like"
+    database.save(loaded, replace=False)
+    database.close()
+
+    assert rows(path) == [
+        ("file1", "alice", "fruit", "apple", "love"),
+        ("file1", "alice", "fruit", "pear", "review"),
+        ("file1", "alice", "fruit", "plum", "like"),
+    ]
+
+
+def test_changes_are_written_in_batches(tmp_path):
+    path = tmp_path / "ratings.db"
+    store = make_store()
+    database = SQLiteRatings(path, "alice", "file1", batch_rows=2)
+    database.attach(store)
+
+    store["fruit"]["apple"] = "love"
+    assert rows(path) == []
+
+    # The latest rating of a food is the only one kept
+    store["fruit"]["apple"] = "dislike"
+    assert rows(path) == []
+
+    store["fruit"]["pear"] = "like"
+    assert rows(path) == [
+        ("file1", "alice", "fruit", "apple", "dislike"),
+        ("file1", "alice", "fruit", "pear", "like"),
+    ]
+
+    store["fruit"]["plum"] = "love"
+    assert len(rows(path)) == 2
+    database.flush()
+    assert len(rows(path)) == 3
+    database.close()
+
+
+def test_ratings_are_scoped_by_dataset_and_user(tmp_path):
+    path = tmp_path / "ratings.db"
+    for user, dataset, rating in [("alice", "file1", "love"),
+                                  ("bob", "file1", "dislike"),
+                                  ("alice", "file2", "like")]:
+        store = make_store()
+        store["fruit"]["apple"] = rating
+        store.setdefault(dataset, {})[user] = rating
+        database = SQLiteRatings(path, user, dataset)
+        database.save(store)
+        database.close()
+
+    loaded = make_store()
+    database = SQLiteRatings(path, "alice", "file1")
+    database.load(loaded)
+
+    assert loaded.to_dict() == {"fruit": {"apple": "love", "pear": "review"},
+                                "file1": {"alice": "love"}}
+    assert database.user_count() == 2
+    assert database.rating_counts() == [("dislike", 2), ("love", 2),
+                                        ("review", 2)]
+    database.close()
+
+
+def test_dataset_totals(tmp_path):
+    path = tmp_path / "ratings.db"
+    for user, dataset in [("alice", "file1"), ("bob", "file1"),
+                          ("alice", "file2")]:
+        database = SQLiteRatings(path, user, dataset)
+        database.save(make_store())
+        database.close()
+
+    assert dataset_totals(path, "file1") == (2, [("like", 2), ("review", 2)])
+    assert dataset_totals(path, "file2") == (1, [("like", 1), ("review", 1)])
+    assert dataset_totals(path, "missing") == (0, [])
+
+
+def test_reloading_does_not_duplicate_foods(tmp_path):
+    path = tmp_path / "ratings.db"
+    store = RatingStore.from_dict({"fruit": {"101": "like"}}, ratings)
+    database = SQLiteRatings(path, "alice", "file1")
+    database.save(store)
+    database.load(store)
+    database.save(store, replace=False)
+    database.load(store)
+    database.close()
+
+    assert store.to_dict() == {"fruit": {"101": "like"}}
+    assert len(rows(path)) == 1
@@ -0,0 +1,161 @@
+import pandas as pd
+
+from streamlit_in_steps.store import RatingStore, overlay_max_fraction
+
+ratings = ["love", "like", "indifferent", "dislike", "review"]
+
+
+def make_store(foods=None):
+    return RatingStore.from_dict(foods or {
+        "fruit": {"apple": "like", "banana": "love", "cherry": "review"},
+        "meat": {"beef": "dislike"},
+    }, ratings)
+
+
+def test_copy_changes_do_not_leak():
+    base = make_store()
+    first = base.copy()
+    second = base.copy()
+
+    first["fruit"]["apple"] = "dislike"
+    second["fruit"]["banana"] = "indifferent"
+
+    assert base.to_dict() == make_store().to_dict()
+    assert first["fruit"]["apple"] == "dislike"
+    assert first["fruit"]["banana"] == "love"
+    assert second["fruit"]["apple"] == "like"
+    assert second["fruit"]["banana"] == "indifferent"
+
+
+def test_base_changes_do_not_leak_into_copies():
+    base = make_store()
+    session = base.copy()
+
+    base["fruit"]["apple"] = "love"
+
+    assert session["fruit"]["apple"] == "like"
+
+
+def test_copy_switches_from_overlay_to_own_codes():
+    foods = {"fruit": {f"food {number}": "review"
+                       for number in range(overlay_max_fraction * 4)}}
+    base = make_store(foods)
+    session = base.copy()
+    fruit = session["fruit"]
+
+    # A few changes are kept in the overlay over the shared codes
+    fruit["food 0"] = "love"
+    assert fruit._overlay == {0: 0}
+    assert fruit._codes is base["fruit"]._codes
+
+    # Beyond the overlay limit the codes are copied and the overlay folded in
+    for number in range(1, 6):
+        fruit[f"food {number}"] = "like"
+    assert fruit._overlay is None
+    assert fruit._codes is not base["fruit"]._codes
+
+    assert fruit["food 0"] == "love"
+    assert [fruit[f"food {number}"] for number in range(1, 6)] == \
+        ["like"] * 5
+    assert fruit["food 6"] == "review"
+    assert set(base["fruit"].values()) == {"review"}
+
+    # Changes after the switch are written to the copied codes
+    fruit["food 7"] = "dislike"
+    assert fruit["food 7"] == "dislike"
+    assert base["fruit"]["food 7"] == "review"
+
+
+def test_added_foods():
+    base = make_store()
+    session = base.copy()
+    changes = []
+    session.listeners.append(lambda *change: changes.append(change))
+
+    session["fruit"]["date"] = "love"
+    session["veg"] = {}
+    session["veg"]["leek"] = "like"
+
+    assert list(session["fruit"]) == ["apple", "banana", "cherry", "date"]
+    assert session["fruit"]["date"] == "love"
+    assert "date" in session["fruit"]
+    assert len(session["fruit"]) == 4
+    assert "date" not in base["fruit"]
+    assert "veg" not in base
+    assert changes == [("fruit", "date", None, "love"),
+                       ("veg", "leek", None, "like")]
+
+    # Added foods are copied with the session, not shared
+    later = session.copy()
+    later["fruit"]["date"] = "dislike"
+    assert session["fruit"]["date"] == "love"
+
+
+def test_unchanged_rating_is_not_notified():
+    session = make_store().copy()
+    changes = []
+    session.listeners.append(lambda *change: changes.append(change))
+
+    session["fruit"]["apple"] = "like"
+    session["fruit"]["apple"] = "love"
+
+    assert changes == [("fruit", "apple", "like", "love")]
+
+
+def test_codes_after_changes():
+    session = make_store().copy()
+    session["fruit"]["apple"] = "love"
+    session["fruit"]["date"] = "dislike"
+
+    assert session["fruit"].codes().tolist() == [0, 0, 4, 3]
+    assert session["fruit"].names() == ["apple", "banana", "cherry", "date"]
+
+
+def test_unknown_rating_gets_a_new_code():
+    session = make_store().copy()
+    session["fruit"]["apple"] = "maybe"
+
+    assert session["fruit"]["apple"] == "maybe"
+    assert session["fruit"].codes().tolist()[0] == len(ratings)
+
+
+def test_to_long_frame_after_changes():
+    session = make_store().copy()
+    session["fruit"]["cherry"] = "like"
+    session["meat"]["lamb"] = "love"
+
+    frame = session.to_long_frame()
+
+    assert frame.astype(str).to_dict("list") == {
+        "food_type": ["fruit", "fruit", "fruit", "meat", "meat"],
+        "food": ["apple", "banana", "cherry", "beef", "lamb"],
+        "rating": ["like", "love", "like", "dislike", "love"],
+    }
+
+
+def test_to_wide_frame_after_changes():
+    session = make_store().copy()
+    session["meat"]["beef"] = "like"
+    session["meat"]["lamb"] = "love"
+
+    frame = session.to_wide_frame()
+
+    assert list(frame.columns) == ["fruit", "fruit_rating",
+                                   "meat", "meat_rating"]
+    assert frame["fruit"].tolist() == ["apple", "banana", "cherry"]
+    assert frame["fruit_rating"].tolist() == ["like", "love", "review"]
+    # The shorter food type is padded with empty names and missing ratings
+    assert frame["meat"].tolist() == ["beef", "lamb", ""]
+    assert frame["meat_rating"].tolist()[:2] == ["like", "love"]
+    assert pd.isna(frame["meat_rating"].tolist()[2])
+
+
+def test_setdefault_returns_the_stored_food_ratings():
+    session = make_store().copy()
+
+    session.setdefault("veg", {})["leek"] = "like"
+    session.setdefault("fruit", {})["apple"] = "love"
+
+    assert session["veg"]["leek"] == "like"
+    assert session["fruit"]["apple"] == "love"
+    assert len(session["fruit"]) == 3
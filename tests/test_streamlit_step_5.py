@@ -0,0 +1,62 @@
+import os
+import shutil
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+app_path = os.path.join(os.path.dirname(__file__), os.pardir, "src",
+                        "streamlit_in_steps", "streamlit_step_5.py")
+test_file = os.path.join(os.path.dirname(__file__), os.pardir, "data",
+                         "food_ratings_test.csv")
+
+
+# Run step 5 in a temporary directory with the test file picked from the
+# server data directory
+def run_app(tmp_path, monkeypatch):
+    (tmp_path / "data").mkdir()
+    (tmp_path / "output").mkdir()
+    shutil.copy(test_file, tmp_path / "data")
+    monkeypatch.chdir(tmp_path)
+
+    at = AppTest.from_file(os.path.abspath(app_path), default_timeout=60)
+    at.run()
+    at.radio(key="data_source").set_value("Server").run()
+    at.selectbox(key="dataset").set_value("food_ratings_test.csv").run()
+    assert not at.exception
+    return at
+
+
+def rating_radios(at):
+    return [radio for radio in at.radio
+            if str(radio.key).startswith("food_widget/")]
+
+
+def test_ratings_are_kept_with_a_database_and_no_user_name(
+        tmp_path, monkeypatch):
+    monkeypatch.setenv("FOOD_RATINGS_DB", str(tmp_path / "ratings.db"))
+    at = run_app(tmp_path, monkeypatch)
+    store = at.session_state.foods
+    radio = rating_radios(at)[0]
+    assert radio.value != "love"
+
+    radio.set_value("love").run()
+
+    assert not at.exception
+    assert rating_radios(at)[0].value == "love"
+    assert at.session_state.foods is store
+    assert at.session_state.ratings_db is None
+    assert os.listdir(tmp_path / "output" / "journal")
+
+
+def test_files_are_not_parsed_again_once_the_ratings_are_built(
+        tmp_path, monkeypatch):
+    at = run_app(tmp_path, monkeypatch)
+    # As if the parsed file had been evicted from the shared cache
+    st.cache_resource.clear()
+
+    at.toggle(key="show_csv_dataframe").set_value(True).run()
+
+    assert not at.exception
+    assert "CSV cache: 0 hits, 0 misses, 0 files" in [
+        caption.value for caption in at.sidebar.caption]
+    assert len(at.dataframe) >= 1
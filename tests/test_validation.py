@@ -0,0 +1,147 @@
+import io
+
+import numpy as np
+
+from streamlit_in_steps.ingest import load_foods
+from streamlit_in_steps.validation import (ValidationReport, normalize_names,
+                                           normalize_ratings, report_examples)
+
+
+def test_normalize_ratings():
+    ratings, missing, fixed, unknown = normalize_ratings(np.array(
+        ["Love ", None, "LIKE", "meh", "like", " In different"],
+        dtype=object))
+
+    assert ratings.tolist() == ["love", "review", "like", "review", "like",
+                                "review"]
+    assert missing.tolist() == [False, True, False, False, False, False]
+    assert fixed.tolist() == [True, False, True, False, False, False]
+    assert unknown.tolist() == [False, False, False, True, False, True]
+
+
+def test_normalize_ratings_only_matches_distinct_values():
+    values = np.array(["like", " Like"] * 1000, dtype=object)
+
+    ratings, missing, fixed, unknown = normalize_ratings(values)
+
+    assert set(ratings.tolist()) == {"like"}
+    assert fixed.sum() == 1000
+    assert not missing.any() and not unknown.any()
+
+
+def test_normalize_names():
+    names, missing, fixed = normalize_names(np.array(
+        [" apple", "pear", None, "  ", "kiwi "], dtype=object))
+
+    assert names.tolist() == ["apple", "pear", None, None, "kiwi"]
+    assert missing.tolist() == [False, False, True, True, False]
+    assert fixed.tolist() == [True, False, False, True, True]
+
+
+def test_normalize_names_turns_numbers_into_text():
+    names, missing, fixed = normalize_names(np.array(
+        [7, " fig", None], dtype=object))
+
+    assert names.tolist() == ["7", "fig", None]
+    assert missing.tolist() == [False, False, True]
+    assert fixed.tolist() == [False, True, False]
+
+
+def test_report_counts_and_examples():
+    report = ValidationReport()
+    report.add("unknown rating", np.arange(1, 9),
+               np.array([f"bad {row}" for row in range(1, 9)]))
+    report.add("unknown rating", np.array([20]), np.array(["worse"]))
+    report.add("missing rating", np.array([3, 4]))
+    report.add("never found", np.array([], dtype=int))
+
+    assert report.counts == {"unknown rating": 9, "missing rating": 2}
+    assert len(report) == 11
+    assert len(report.examples["unknown rating"]) == report_examples
+    assert report.examples["unknown rating"][0] == "row 1 ('bad 1')"
+    assert report.examples["missing rating"] == ["row 3", "row 4"]
+    assert report.summary()["rows"].tolist() == [9, 2]
+
+
+def test_report_extend_names_the_source():
+    first = ValidationReport()
+    first.add("missing rating", np.array([2]))
+    second = ValidationReport()
+    second.add("missing rating", np.array([5, 6]))
+
+    report = ValidationReport()
+    report.extend(first, "a.csv")
+    report.extend(second, "b.csv")
+
+    assert report.counts == {"missing rating": 3}
+    assert report.examples["missing rating"] == [
+        "a.csv row 2", "b.csv row 5", "b.csv row 6"]
+
+
+def test_load_long_format_in_chunks_with_duplicates_across_chunks():
+    csv = ("food_type,food,rating\n"
+           "fruit,apple,like\n"
+           "fruit,pear,love\n"
+           "fruit,apple,dislike\n"
+           "meat, beef ,Love\n"
+           "fruit,pear,bogus\n"
+           ",ham,like\n")
+    report = ValidationReport()
+
+    preview, foods, csv_format = load_foods(io.StringIO(csv), chunksize=2,
+                                            report=report)
+
+    assert csv_format == "long"
+    # A repeated food keeps its first position and its last rating
+    assert foods == {"fruit": {"apple": "dislike", "pear": "review"},
+                     "meat": {"beef": "love"}}
+    assert list(foods["fruit"]) == ["apple", "pear"]
+    assert report.counts == {
+        "food name whitespace fixed": 1,
+        "rating case or whitespace fixed": 1,
+        "duplicate food (last rating kept)": 2,
+        "missing food type or food (skipped)": 1,
+        "unknown rating (set to review)": 1,
+    }
+    # Rows are numbered across chunks
+    assert report.examples["duplicate food (last rating kept)"] == [
+        "row 3 ('apple')", "row 5 ('pear')"]
+    assert report.examples["missing food type or food (skipped)"] == [
+        "row 6"]
+    # Only the first chunk is kept as the preview
+    assert len(preview) == 2
+
+
+def test_load_wide_format_in_chunks_with_duplicates_across_chunks():
+    csv = ("fruit,fruit_rating,meat\n"
+           "apple,like,beef\n"
+           "pear,,lamb\n"
+           "apple,love,beef\n"
+           ",like,\n")
+    report = ValidationReport()
+
+    preview, foods, csv_format = load_foods(io.StringIO(csv), chunksize=2,
+                                            report=report)
+
+    assert csv_format == "wide"
+    assert foods == {"fruit": {"apple": "love", "pear": "review"},
+                     "meat": {"beef": "review", "lamb": "review"}}
+    assert report.counts == {
+        "missing rating (set to review)": 1,
+        "rating without a food (skipped)": 1,
+        "duplicate food (last rating kept)": 2,
+    }
+    assert report.examples["duplicate food (last rating kept)"] == [
+        "row 3 ('apple')", "row 3 ('beef')"]
+    assert len(preview) == 4
+
+
+def test_numeric_food_names_are_loaded_as_text():
+    csv = ("fruit,fruit_rating,meat,meat_rating\n"
+           "101,like,007,love\n"
+           "102,love,,\n")
+
+    preview, foods, csv_format = load_foods(io.StringIO(csv))
+
+    assert foods == {"fruit": {"101": "like", "102": "love"},
+                     "meat": {"007": "love"}}
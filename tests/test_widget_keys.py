@@ -0,0 +1,52 @@
+from streamlit_in_steps.widget_keys import (WidgetKeys, clear_widget_state,
+                                            session_state_size,
+                                            widget_key_prefix)
+
+
+def test_keys_are_scoped_by_file_and_food_type():
+    keys = WidgetKeys("1a2b3c4d5e6f7a8b")
+    other_file = WidgetKeys("ffffffffffff0000")
+
+    assert keys.key("fruit", "rating", "apple").startswith(
+        f"{widget_key_prefix}1a2b3c4d5e6f/")
+    assert keys.key("fruit", "rating", "apple") != \
+        keys.key("veg", "rating", "apple")
+    assert keys.key("fruit", "rating", "apple") != \
+        other_file.key("fruit", "rating", "apple")
+    assert keys.key("fruit", "new_food") != \
+        keys.key("fruit", "rating", "new_food")
+
+
+def test_collect_drops_unused_widget_state():
+    first_run = WidgetKeys("1a2b3c4d5e6f")
+    session_state = {
+        first_run.key("fruit", "rating", "apple"): "like",
+        first_run.key("fruit", "rating", "pear"): "love",
+        "food_type": "fruit",
+        "foods": {"fruit": {"apple": "like"}},
+        "user_name": "alice",
+    }
+
+    second_run = WidgetKeys("1a2b3c4d5e6f")
+    kept = second_run.key("fruit", "rating", "apple")
+    added = second_run.key("fruit", "rating", "kiwi")
+
+    assert second_run.collect(session_state) == 1
+    # Keys not yet in the session state are not added
+    assert added not in session_state
+    assert set(session_state) == {kept, "food_type", "foods", "user_name"}
+
+
+def test_clear_widget_state_keeps_other_session_state():
+    keys = WidgetKeys("1a2b3c4d5e6f")
+    session_state = {
+        keys.key("fruit", "rating", "apple"): "like",
+        keys.key("fruit", "new_food"): "kiwi",
+        "food_type": "fruit",
+        1: "not a string key",
+    }
+
+    assert session_state_size(session_state)[:2] == (4, 2)
+    assert clear_widget_state(session_state) == 2
+    assert session_state == {"food_type": "fruit", 1: "not a string key"}
+    assert session_state_size(session_state) == (2, 0, 0)